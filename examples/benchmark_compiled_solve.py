@@ -0,0 +1,48 @@
+"""
+Compares the eager TensorFlow solve with the compiled one (tf.function, optionally XLA).
+
+    python examples/benchmark_compiled_solve.py --size 512 --repeat 50
+"""
+import argparse
+import time
+import numpy as np
+import tensorflow as tf
+from fringe.solvers.AngularSpectrum import AngularSpectrumSolver
+
+
+def timeit(function, field, k, z_values):
+    function(field, k, z_values[0])  # Warm up: tracing and compilation.
+    start = time.perf_counter()
+    for z in z_values:
+        result = function(field, k, z)
+    result.numpy()
+    return (time.perf_counter() - start) / len(z_values)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--batch', type=int, default=0, help="Batch size, 0 for an unbatched field.")
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    shape = (args.batch, args.size, args.size) if args.batch else (args.size, args.size)
+    field = tf.complex(tf.random.uniform(shape), tf.random.uniform(shape))
+    k = 2 * np.pi / 0.532
+    # A new z on every call, so the eager path computes a new transfer function like the compiled one.
+    z_values = np.linspace(-300, -500, args.repeat)
+
+    solver = AngularSpectrumSolver(shape, 1.12, is_batched=bool(args.batch), padding="same", backend="TensorFlow",
+                                   cache=None)
+    eager = timeit(solver.solve, field, k, z_values)
+    print("eager:        {:.2f} ms".format(eager * 1e3))
+    for jit in (False, True):
+        compiled = solver.compile(jit_compile=jit)
+        t = timeit(compiled, field, k, z_values)
+        label = "xla:" if jit else "tf.function:"
+        print("{:13} {:.2f} ms ({:.2f}x), traces: {}".format(label, t * 1e3, eager / t,
+                                                             compiled.experimental_get_tracing_count()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+from ..backend.Numpy import Numpy
+import numpy as np
+from collections import OrderedDict
+import multiprocessing
+import threading
+import atexit
+import warnings
+import pickle
+import os
+import pyfftw
+
+
+class FFTW(Numpy):
+    """
+    Numpy backend whose Fourier transforms run on planned FFTW transforms (pyfftw). A plan with its own pair of aligned
+    buffers is created once per (shape, dtype, dims) and reused by later calls; the least recently used plans beyond
+    max_plans are released. Planning results (wisdom) are kept in a file which is loaded on import and written on exit
+    when new plans were made, so later processes skip the expensive planning step.
+    """
+    threads = multiprocessing.cpu_count()
+    # 'FFTW_ESTIMATE', 'FFTW_MEASURE', 'FFTW_PATIENT' or 'FFTW_EXHAUSTIVE'.
+    planner_effort = 'FFTW_MEASURE'
+    # Transforms write straight into an aligned 'out'.
+    native_out = True
+    # Transforms run in the plan buffers, a forward and an inverse plan keep an input and an output array each.
+    transform_temporaries = 0
+    plan_arrays = 4
+    # Number of plans kept, each direction counts separately.
+    max_plans = 16
+    wisdom_path = os.environ.get('FRINGE_FFTW_WISDOM',
+                                 os.path.join(os.path.expanduser('~'), '.fringe', 'fftw_wisdom.pkl'))
+
+    _plans = OrderedDict()
+    _lock = threading.Lock()
+    _wisdom_changed = False
+
+    @classmethod
+    def load_wisdom(cls, path=None):
+        """
+        Imports FFTW wisdom from the given file, or from FFTW.wisdom_path. Missing files are ignored.
+        """
+        path = path or cls.wisdom_path
+        if not os.path.isfile(path):
+            return
+        try:
+            with open(path, 'rb') as f:
+                pyfftw.import_wisdom(pickle.load(f))
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            warnings.warn("FFTW wisdom could not be loaded from {}: {}".format(path, e))
+
+    @classmethod
+    def save_wisdom(cls, path=None):
+        """
+        Exports the accumulated FFTW wisdom to the given file, or to FFTW.wisdom_path. It is called on exit when
+        new plans were made.
+        """
+        path = path or cls.wisdom_path
+        cls._wisdom_changed = False
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(pyfftw.export_wisdom(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            warnings.warn("FFTW wisdom could not be saved to {}: {}".format(path, e))
+
+    @classmethod
+    def plan(cls, shape, dims, dtype='complex64'):
+        """
+        Creates the forward and inverse plans of the given shape ahead of the first transform, e.g. with the padded
+        shape of an AngularSpectrumSolver.
+
+        :return: The forward and inverse pyfftw.FFTW objects.
+        """
+        return cls._plan(shape, dims, dtype, 'FFTW_FORWARD')[0], cls._plan(shape, dims, dtype, 'FFTW_BACKWARD')[0]
+
+    @classmethod
+    def _plan(cls, shape, dims, dtype, direction):
+        dtype = np.dtype('complex64') if np.dtype(dtype) in (np.complex64, np.float32) else np.dtype('complex128')
+        key = (tuple(shape), dtype.str, dims, direction, cls.threads, cls.planner_effort)
+        with cls._lock:
+            if key in cls._plans:
+                cls._plans.move_to_end(key)
+            else:
+                input_array = pyfftw.empty_aligned(shape, dtype=dtype)
+                output_array = pyfftw.empty_aligned(shape, dtype=dtype)
+                plan = pyfftw.FFTW(input_array, output_array, axes=tuple(range(-dims, 0)), direction=direction,
+                                   flags=(cls.planner_effort,), threads=cls.threads)
+                cls._plans[key] = (plan, threading.Lock())
+                cls._wisdom_changed = True
+                while len(cls._plans) > cls.max_plans:
+                    cls._plans.popitem(last=False)
+            return cls._plans[key]
+
+    @staticmethod
+    def _fits(plan, array, alignment, strides):
+        return (array.dtype == plan.input_dtype and array.strides == strides and
+                array.ctypes.data % alignment == 0)
+
+    @classmethod
+    def _execute(cls, input_, dims, direction, out):
+        plan, lock = cls._plan(input_.shape, dims, input_.dtype, direction)
+        with lock:
+            input_array, output_array = plan.input_array, plan.output_array
+            if not cls._fits(plan, input_, plan.input_alignment, plan.input_strides):
+                input_array[...] = input_
+                input_ = input_array
+            # The plan is out of place, so the result goes to a fresh aligned array if 'out' does not fit or overlaps.
+            target = out
+            if (target is None or np.may_share_memory(target, input_) or
+                    not cls._fits(plan, target, plan.output_alignment, plan.output_strides)):
+                target = pyfftw.empty_aligned(input_.shape, dtype=plan.output_dtype)
+            try:
+                # Both arrays fit the plan, so pyfftw runs on them without copies (and scales the inverse by 1/N).
+                plan(input_, target)
+            finally:
+                # The plan must not keep the arrays of the caller alive.
+                plan.update_arrays(input_array, output_array)
+        if out is None or out is target:
+            return target
+        np.copyto(out, target)
+        return out
+
+    @classmethod
+    def fft(cls, input_, dims, overwrite_input=False, out=None):
+        # x must be in the shape of 'NWHC' as 2D or 'NWC'/'NW' as 1D
+        return cls._execute(input_, dims, 'FFTW_FORWARD', out)
+
+    @classmethod
+    def ifft(cls, input_, dims, overwrite_input=False, out=None):
+        # x must be in the shape of 'NWHC' as 2D or 'NWC'/'NW' as 1D
+        return cls._execute(input_, dims, 'FFTW_BACKWARD', out)
+
+
+FFTW.load_wisdom()
+atexit.register(lambda: FFTW._wisdom_changed and FFTW.save_wisdom())
@@ -1,8 +1,26 @@
 from ..backend.core import CoreFunctions
 import numpy as np
+import inspect
+
+# numpy >= 2.0 transforms can write their result into a given array.
+_FFT_OUT = 'out' in inspect.signature(np.fft.fftn).parameters
+
+
+def _transform_into(transform, input_, dims, out):
+    axes = tuple(range(-dims, 0))
+    if _FFT_OUT:
+        return transform(input_, axes=axes, out=out)
+    out[...] = transform(input_, axes=axes)
+    return out
 
 
 class Numpy(CoreFunctions):
+    # Whether fft/ifft write into 'out' without an intermediate result array.
+    native_out = _FFT_OUT
+    # Bytes per element which fft/ifft allocate besides their input and 'out' arrays, at most, when overwrite_input is
+    # set. Single precision is transformed in double precision, with a converted copy of the input and a result.
+    transform_temporaries = 32
+
     @staticmethod
     def convert(input_, dtype):
         return np.array(input_, dtype=dtype)
@@ -19,6 +37,14 @@ class Numpy(CoreFunctions):
     def reduce_sum(input_, axis):
         return np.sum(input_, axis=axis)
 
+    @staticmethod
+    def stack(inputs, axis):
+        return np.stack(inputs, axis=axis)
+
+    @staticmethod
+    def concat(inputs, axis):
+        return np.concatenate(inputs, axis=axis)
+
     @staticmethod
     def pad(input_, padding, fill_value):
         return np.pad(input_, padding, mode="constant", constant_values=fill_value)
@@ -40,10 +66,26 @@ class Numpy(CoreFunctions):
     def angle(input_):
         return np.angle(input_)
 
+    @staticmethod
+    def conj(input_):
+        return np.conj(input_)
 
     @staticmethod
-    def fft(input_, dims):
+    def replace_amplitude(field, amplitude):
+        # Runs in place on 'field' with a single real temporary; zeros get a phase of 0 as np.angle gives.
+        mag = np.abs(field)
+        nonzero = mag > 0
+        np.divide(amplitude, mag, out=mag, where=nonzero)
+        field *= mag
+        np.copyto(field, amplitude, where=~nonzero)
+        return field
+
+
+    @staticmethod
+    def fft(input_, dims, overwrite_input=False, out=None):
         # x must be in the shape of 'NWHC' as 2D or 'NWC'/'NW' as 1D
+        if out is not None:
+            return _transform_into(np.fft.fftn, input_, dims, out)
         if dims == 1:
             return np.fft.fft(input_)
         elif dims == 2:
@@ -52,8 +94,10 @@ class Numpy(CoreFunctions):
             return np.fft.fftn(input_)
 
     @staticmethod
-    def ifft(input_, dims):
+    def ifft(input_, dims, overwrite_input=False, out=None):
         # x must be in the shape of 'NWHC' as 2D or 'NWC'/'NW' as 1D
+        if out is not None:
+            return _transform_into(np.fft.ifftn, input_, dims, out)
         if dims == 1:
             return np.fft.ifft(input_)
         elif dims == 2:
@@ -65,6 +109,10 @@ class Numpy(CoreFunctions):
     def fftshift(input_):
         return np.fft.fftshift(input_)
 
+    @staticmethod
+    def ifftshift(input_):
+        return np.fft.ifftshift(input_)
+
     @staticmethod
     def exp(input_):
         return np.exp(input_)
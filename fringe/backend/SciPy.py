@@ -0,0 +1,43 @@
+from ..backend.Numpy import Numpy
+import scipy.fft
+
+
+class SciPy(Numpy):
+    """
+    Numpy backend whose Fourier transforms run on scipy.fft. Transforms are multi-threaded over 'workers' threads and
+    preserve single precision, i.e. complex64 inputs give complex64 outputs.
+    """
+    # Number of threads used by the transforms. Negative values wrap around os.cpu_count(), so -1 uses all cores.
+    workers = -1
+    native_out = False
+    # Complex input is transformed in place when overwrite_input is set.
+    transform_temporaries = 0
+
+    @classmethod
+    def configure(cls, workers):
+        """
+        Returns a copy of the backend class with a different worker count, e.g. backend=SciPy.configure(workers=4).
+        """
+        return type(cls.__name__, (cls,), {'workers': workers})
+
+    @staticmethod
+    def next_fast_len(n):
+        return scipy.fft.next_fast_len(int(n))
+
+    @classmethod
+    def fft(cls, input_, dims, overwrite_input=False, out=None):
+        # x must be in the shape of 'NWHC' as 2D or 'NWC'/'NW' as 1D
+        result = scipy.fft.fftn(input_, axes=tuple(range(-dims, 0)), overwrite_x=overwrite_input, workers=cls.workers)
+        if out is not None:
+            out[...] = result
+            return out
+        return result
+
+    @classmethod
+    def ifft(cls, input_, dims, overwrite_input=False, out=None):
+        # x must be in the shape of 'NWHC' as 2D or 'NWC'/'NW' as 1D
+        result = scipy.fft.ifftn(input_, axes=tuple(range(-dims, 0)), overwrite_x=overwrite_input, workers=cls.workers)
+        if out is not None:
+            out[...] = result
+            return out
+        return result
@@ -19,6 +19,14 @@ class TensorFlow(CoreFunctions):
     def reduce_sum(input_, axis):
         return tf.reduce_sum(input_, axis=axis)
 
+    @staticmethod
+    def stack(inputs, axis):
+        return tf.stack(inputs, axis=axis)
+
+    @staticmethod
+    def concat(inputs, axis):
+        return tf.concat(inputs, axis=axis)
+
     @staticmethod
     def pad(input_, padding, fill_value):
         return tf.pad(input_, padding, "CONSTANT", fill_value)
@@ -33,11 +41,27 @@ class TensorFlow(CoreFunctions):
         for i, n in enumerate(padding):
             n1 = n[0]
             n2 = n[1]
-            d = shape[i]
+            # Dimensions unknown at tracing time, e.g. the batch size of a compiled solve, are read at run time.
+            d = shape[i] if shape[i] is not None else tf.shape(input_)[i]
             begin.append(n1)
             size.append(d - n1 - n2)
         return tf.slice(input_, begin, size)
 
+    @staticmethod
+    def compile(function, input_shape, input_dtype, jit_compile=False):
+        # k and z are traced as float32 scalars, so new values do not retrace the function.
+        signature = [tf.TensorSpec(input_shape, input_dtype), tf.TensorSpec([], tf.float32),
+                     tf.TensorSpec([], tf.float32)]
+        compiled = tf.function(function, input_signature=signature, jit_compile=jit_compile)
+
+        # Python and numpy float64 values of k and z are cast to the float32 of the signature.
+        def wrapper(input_, k, z):
+            return compiled(input_, tf.cast(k, tf.float32), tf.cast(z, tf.float32))
+
+        wrapper.experimental_get_tracing_count = compiled.experimental_get_tracing_count
+        wrapper.function = compiled
+        return wrapper
+
     @staticmethod
     def abs(input_):
         return tf.math.abs(input_)
@@ -47,7 +71,11 @@ class TensorFlow(CoreFunctions):
         return tf.math.angle(input_)
 
     @staticmethod
-    def fft(input_, dims):
+    def conj(input_):
+        return tf.math.conj(input_)
+
+    @staticmethod
+    def fft(input_, dims, overwrite_input=False):
         # x must be in the shape of 'NWHC' as 2D or 'NWC'/'NW' as 1D
         if dims == 1:
             return tf.signal.fft(input_)
@@ -57,7 +85,7 @@ class TensorFlow(CoreFunctions):
             return tf.signal.fft3d(input_)
 
     @staticmethod
-    def ifft(input_, dims):
+    def ifft(input_, dims, overwrite_input=False):
         # x must be in the shape of 'NWHC' as 2D or 'NWC'/'NW' as 1D
         if dims == 1:
             return tf.signal.ifft(input_)
@@ -70,6 +98,10 @@ class TensorFlow(CoreFunctions):
     def fftshift(input_):
         return tf.signal.fftshift(input_)
 
+    @staticmethod
+    def ifftshift(input_):
+        return tf.signal.ifftshift(input_)
+
     @staticmethod
     def exp(input_):
         return tf.math.exp(input_)
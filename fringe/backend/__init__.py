@@ -1,6 +1,38 @@
 from os.path import dirname, basename, isfile, join
+from importlib import import_module
 import glob
 
 modules = glob.glob(join(dirname(__file__), "*.py"))
 __all__ = [basename(f)[:-3] for f in modules if isfile(f) and not f.endswith('__init__.py')]
 del modules
+
+# Built-in backends by name -> module (and class) name. Modules are imported on first use, so e.g. numpy users never
+# pay for importing tensorflow, and optional dependencies are only required when their backend is requested.
+_BUILT_IN = {'numpy': 'Numpy',
+             'tensorflow': 'TensorFlow',
+             'scipy': 'SciPy',
+             'fftw': 'FFTW'}
+_registry = {}
+
+
+def register_backend(name, backend):
+    """
+    Registers a backend class (inherited from backend.core.CoreFunctions) under a case-insensitive name, so it could
+    be selected by name, e.g. AngularSpectrumSolver(..., backend=name).
+    """
+    _registry[name.lower()] = backend
+
+
+def get_backend(name):
+    """
+    :return: The backend class registered under the given case-insensitive name. Built-in backends are imported here
+        on first use.
+    """
+    key = name.lower()
+    if key not in _registry:
+        if key not in _BUILT_IN:
+            raise ValueError("Unknown backend '{}'. Available backends: {}."
+                             .format(name, ', '.join(sorted(set(_BUILT_IN) | set(_registry)))))
+        module = _BUILT_IN[key]
+        _registry[key] = getattr(import_module('.' + module, __name__), module)
+    return _registry[key]
@@ -1,7 +1,47 @@
 from abc import abstractmethod
 
 
+def smooth_length(n, radices=(2, 3, 5, 7)):
+    """
+    :return: The smallest integer not smaller than n whose prime factors are all in radices.
+    """
+    n = max(int(n), 1)
+    while True:
+        m = n
+        for r in radices:
+            while m % r == 0:
+                m //= r
+        if m == 1:
+            return n
+        n += 1
+
+
 class CoreFunctions:
+    # Prime factors for which the backend FFT has fast kernels.
+    fft_radices = (2, 3, 5, 7)
+
+    @classmethod
+    def next_fast_len(cls, n):
+        return smooth_length(n, cls.fft_radices)
+
+    @classmethod
+    def replace_amplitude(cls, field, amplitude):
+        """
+        Keeps the phase of a complex field and replaces its amplitude: amplitude · exp(i·angle(field)). Backends may
+        overwrite 'field' to avoid temporaries, so it must not be used afterwards.
+        """
+        zeros = cls.zeros_like(amplitude, dtype=amplitude.dtype)
+        return cls.multiply(cls.complex(real=amplitude, imag=zeros),
+                            cls.exp(cls.complex(real=zeros, imag=cls.angle(field))))
+
+    @staticmethod
+    def compile(function, input_shape, input_dtype, jit_compile=False):
+        """
+        Compiles function(input_, k, z) for inputs of the given shape and dtype, and scalar k and z. Backends without
+        graph compilation return the function as is.
+        """
+        return function
+
     @staticmethod
     @abstractmethod
     def convert(input_):
@@ -27,6 +67,16 @@ class CoreFunctions:
     def reduce_sum(input_, axis):
         raise NotImplementedError
 
+    @staticmethod
+    @abstractmethod
+    def stack(inputs, axis):
+        raise NotImplementedError
+
+    @staticmethod
+    @abstractmethod
+    def concat(inputs, axis):
+        raise NotImplementedError
+
     @staticmethod
     @abstractmethod
     def exp(input_):
@@ -93,15 +143,20 @@ class CoreFunctions:
     def angle(input_):
         raise NotImplementedError
 
+    @staticmethod
+    @abstractmethod
+    def conj(input_):
+        raise NotImplementedError
+
 
     @staticmethod
     @abstractmethod
-    def fft(input_):
+    def fft(input_, dims, overwrite_input=False):
         raise NotImplementedError
 
     @staticmethod
     @abstractmethod
-    def ifft(input_):
+    def ifft(input_, dims, overwrite_input=False):
         raise NotImplementedError
 
     @staticmethod
@@ -109,6 +164,11 @@ class CoreFunctions:
     def fftshift(input_):
         raise NotImplementedError
 
+    @staticmethod
+    @abstractmethod
+    def ifftshift(input_):
+        raise NotImplementedError
+
     @staticmethod
     def zeros(shape, dtype):
         raise NotImplementedError
@@ -0,0 +1,145 @@
+from itertools import islice
+import numpy as np
+
+_INV_PHI = (np.sqrt(5) - 1) / 2
+
+
+def tamura(amp):
+    """
+    Tamura coefficient √(σ/μ) of amplitude images.
+
+    Parameters
+    ----------
+    amp : ndarray - dtype: float32
+        An amplitude image (H, W) or a stack of images (N, H, W).
+
+    :return: The coefficient of each image.
+    """
+    axes = (-2, -1)
+    return np.sqrt(np.std(amp, axis=axes) / np.mean(amp, axis=axes))
+
+
+def gradient_variance(amp):
+    """
+    Variance of the gradient magnitude of amplitude images.
+
+    Parameters
+    ----------
+    amp : ndarray - dtype: float32
+        An amplitude image (H, W) or a stack of images (N, H, W).
+
+    :return: The variance of each image.
+    """
+    gx = np.diff(amp, axis=-1)[..., :-1, :]
+    gy = np.diff(amp, axis=-2)[..., :, :-1]
+    return np.var(np.sqrt(gx * gx + gy * gy), axis=(-2, -1))
+
+
+def spectral_energy(amp, cutoff=0.1):
+    """
+    Fraction of the spectral energy of amplitude images above a radial frequency cutoff. The DC term is excluded.
+
+    Parameters
+    ----------
+    amp : ndarray - dtype: float32
+        An amplitude image (H, W) or a stack of images (N, H, W).
+
+    cutoff : float
+        Radial frequency cutoff in cycles per pixel, between 0 and 0.5. Default is 0.1.
+
+    :return: The high frequency energy fraction of each image.
+    """
+    power = np.abs(np.fft.rfft2(amp)) ** 2
+    fy = np.fft.fftfreq(amp.shape[-2])[:, None]
+    fx = np.fft.rfftfreq(amp.shape[-1])[None, :]
+    f2 = fx * fx + fy * fy
+    high = np.sum(power * (f2 > cutoff * cutoff), axis=(-2, -1))
+    return high / np.sum(power * (f2 > 0), axis=(-2, -1))
+
+
+METRICS = {'tamura': tamura,
+           'gradient_variance': gradient_variance,
+           'spectral_energy': spectral_energy}
+
+
+def find_focus(input_field, k, z_range, solver, steps=21, metric='tamura', maximize=True, tol=None, batch_size=8):
+    """
+    Finds the focus plane of a hologram without exporting images. The z range is swept coarsely with batched
+    propagations from a single forward FFT, then the best coarse step is refined by golden-section search.
+
+    Parameters
+    ----------
+    input_field :  array_like - dtype: complex64
+        The input complex field.
+
+    k : float
+        Wave number.
+
+    z_range :   array_like
+        The range of z values: (min_z, max_z)
+
+    solver : class(solvers.AngularSpectrum.AngularSpectrumSolver)
+        The propagation solver.
+
+    steps : int
+        Number of planes of the coarse sweep. Default is 21.
+
+    metric : string, callable
+        Sharpness metric: 'tamura', 'gradient_variance', 'spectral_energy', or a function mapping a stack of
+        amplitude images (N, H, W) to N scores. Default is 'tamura'.
+
+    maximize : bool
+        Whether the focus maximizes the metric. Amplitude objects are sharpest at a maximum, pure phase objects usually
+        at a minimum. Default is True.
+
+    tol : float
+        Absolute z tolerance of the refinement. Default is 1% of the coarse step.
+
+    batch_size : int
+        Number of planes propagated and scored together during the coarse sweep. Default is 8.
+
+    Example
+    ----------
+    >>> solver = AngularSpectrumSolver(shape=hologram.shape, dr=1.12, is_batched=False, padding="same", backend="numpy")
+    >>> z, zs, scores = find_focus(hologram, 2*PI/532e-3, (-200, -800), solver, metric='gradient_variance')
+
+    :return: The best z, the z values of the coarse sweep and their metric scores.
+    """
+    score = METRICS[metric] if isinstance(metric, str) else metric
+    sign = 1 if maximize else -1
+
+    zs = np.linspace(z_range[0], z_range[1], steps)
+    planes = solver.solve_many(input_field, k, zs, batch_size=batch_size, as_generator=True)
+    scores = []
+    for _ in range(0, steps, batch_size):
+        scores.append(score(np.stack([np.abs(p) for p in islice(planes, batch_size)])))
+    scores = np.concatenate(scores)
+
+    i = int(np.argmax(sign * scores))
+    if steps < 2:
+        return zs[i], zs, scores
+
+    step = abs(zs[1] - zs[0])
+    tol = step / 100 if tol is None else tol
+    a, b = zs[max(i - 1, 0)], zs[min(i + 1, steps - 1)]
+
+    def cost(z):
+        return -sign * float(score(np.abs(solver.solve(input_field, k, z))))
+
+    c, d = b - _INV_PHI * (b - a), a + _INV_PHI * (b - a)
+    fc, fd = cost(c), cost(d)
+    while abs(b - a) > tol:
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - _INV_PHI * (b - a)
+            fc = cost(c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + _INV_PHI * (b - a)
+            fd = cost(d)
+
+    z_best = (a + b) / 2
+    # The refinement interval excludes the best coarse plane only if that plane is better than the refined one.
+    if -sign * scores[i] < min(fc, fd):
+        z_best = zs[i]
+    return z_best, zs, scores
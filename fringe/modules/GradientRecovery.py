@@ -0,0 +1,180 @@
+import logging
+import time
+import numpy
+import tensorflow as tf
+from ..backend.TensorFlow import TensorFlow
+
+logger = logging.getLogger(__name__)
+
+_EPS = 1e-12
+
+
+def propagate(solver, field, k, z):
+    """
+    Propagates the field by solver.solve with a custom gradient. Propagation is linear, so the gradient is the adjoint
+    propagation (see AngularSpectrumSolver.adjoint) of the incoming gradient, and none of the intermediate tensors
+    (padded field, spectrum, product) which autodiff would otherwise keep for every propagation are stored.
+
+    Parameters
+    ----------
+    solver : class(solvers.AngularSpectrum.AngularSpectrumSolver)
+        A solver with the TensorFlow backend.
+
+    field : tensor - dtype: complex64
+        The input complex field.
+
+    k : float
+        Wave number : 2πn/λ
+
+    z : float
+        Axial coordinate of the target plane.
+
+    :return: Complex-valued propagated field.
+    """
+    @tf.custom_gradient
+    def _propagate(x):
+        def grad(dy):
+            return solver.adjoint(dy, k, z)
+        return solver.solve(x, k, z), grad
+
+    return _propagate(field)
+
+
+class GradientPhaseOptimizer:
+    def __init__(self, solver, optimizer='adam', learning_rate=0.05):
+        """
+        Recovers the phase information by multiple intensity-only images captured from different distances, by
+        minimizing the misfit of the propagated amplitudes (or intensities) with gradient descent. Unlike the
+        projections of PhaseRecovery.MultiDistancePhaseOptimizer, the misfit of every plane is weighted equally, which
+        is less sensitive to noise.
+
+        Parameters
+        ----------
+        solver : class(solvers.AngularSpectrum.AngularSpectrumSolver)
+            An angular spectrum solver with the TensorFlow backend.
+
+        optimizer : string
+            'adam' (tf.keras.optimizers.Adam) or 'lbfgs' (scipy.optimize.minimize with L-BFGS-B, requires scipy).
+            Default is 'adam'.
+
+        learning_rate : float
+            Learning rate of Adam. Default is 0.05.
+        """
+        if not issubclass(solver.backend, TensorFlow):
+            raise ValueError("Gradient based recovery requires a solver with the TensorFlow backend.")
+        if optimizer not in ('adam', 'lbfgs'):
+            raise ValueError("Unknown optimizer: {}. Expected 'adam' or 'lbfgs'.".format(optimizer))
+        self.solver = solver
+        self.optimizer = optimizer
+        self.learning_rate = learning_rate
+        self.history = []
+
+    def optimize(self, image_seq, k, z_values, iterations=100, loss='amplitude', initial_phase=None, callback=None,
+                 return_history=False):
+        """
+        Optimizes the complex field of the first plane so that its propagations match all images.
+
+        Parameters
+        ----------
+        image_seq: array_like, list, ndarray - dtype: float32
+            Sequence of intensity-only images.
+
+        k:  float
+            Wave number : 2πn/λ
+
+        z_values:   array-like, list
+            Axial sample-to-sensor distances of which each hologram was acquired from.
+
+        iterations: int
+            Number of optimizer steps (Adam) or the maximum number of iterations (L-BFGS).
+
+        loss: string
+            'amplitude' for the squared misfit of the amplitudes, or 'intensity' for the squared misfit of the
+            intensities. The loss is normalized by the total energy of the images. Default is 'amplitude'.
+
+        initial_phase: array_like, ndarray - dtype: float32 (Optional)
+            Initial phase estimate on the first plane. Default is None (zero phase).
+
+        callback: callable (Optional)
+            Called after every iteration as callback(iteration, loss, elapsed_seconds).
+
+        return_history: bool
+            If True, the list of per-iteration losses is returned along with the field. Default is False.
+
+        :return: The recovered complex field, and the loss history if return_history is True.
+        """
+        if loss not in ('amplitude', 'intensity'):
+            raise ValueError("Unknown loss: {}. Expected 'amplitude' or 'intensity'.".format(loss))
+
+        amplitudes = [tf.abs(tf.convert_to_tensor(img)) for img in image_seq]
+        amplitudes = [tf.cast(a, tf.float32) for a in amplitudes]
+        # Distance from the first plane to each plane.
+        distances = [float(z_values[0] - z) for z in z_values]
+        norm = sum(float(tf.reduce_sum(a ** 2 if loss == 'amplitude' else a ** 4)) for a in amplitudes)
+
+        phase = tf.zeros_like(amplitudes[0]) if initial_phase is None else tf.cast(initial_phase, tf.float32)
+        real = tf.Variable(amplitudes[0] * tf.cos(phase))
+        imag = tf.Variable(amplitudes[0] * tf.sin(phase))
+
+        def objective():
+            field = tf.complex(real, imag)
+            total = 0.
+            for a, z in zip(amplitudes, distances):
+                u = field if z == 0 else propagate(self.solver, field, k, z)
+                intensity = tf.math.real(u) ** 2 + tf.math.imag(u) ** 2
+                # The epsilon keeps the gradient of the amplitude finite at zero.
+                r = tf.sqrt(intensity + _EPS) - a if loss == 'amplitude' else intensity - a * a
+                total += tf.reduce_sum(r * r)
+            return total / norm
+
+        def value_and_gradients():
+            with tf.GradientTape() as tape:
+                value = objective()
+            return value, tape.gradient(value, [real, imag])
+
+        self.history = []
+        start = time.perf_counter()
+
+        def record(value):
+            i = len(self.history)
+            self.history.append(value)
+            elapsed = time.perf_counter() - start
+            if i % 5 == 0:
+                logger.info("step: %d, loss: %.4e, elapsed: %.2fs", i, value, elapsed)
+            if callback is not None:
+                callback(i, value, elapsed)
+
+        if self.optimizer == 'adam':
+            optimizer = tf.keras.optimizers.Adam(learning_rate=self.learning_rate)
+            for _ in range(iterations):
+                value, gradients = value_and_gradients()
+                optimizer.apply_gradients(zip(gradients, [real, imag]))
+                record(float(value))
+        else:
+            self._minimize_lbfgs(real, imag, value_and_gradients, iterations, record)
+
+        result = self.solver.solve(tf.complex(real, imag), k, z_values[0])
+        return (result, self.history) if return_history else result
+
+    @staticmethod
+    def _minimize_lbfgs(real, imag, value_and_gradients, iterations, record):
+        try:
+            from scipy.optimize import minimize
+        except ImportError:
+            raise ImportError("The 'lbfgs' optimizer requires scipy.")
+
+        shape = real.shape
+        size = int(numpy.prod(shape))
+        last = {}
+
+        def fun(v):
+            real.assign(numpy.reshape(v[:size], shape).astype(numpy.float32))
+            imag.assign(numpy.reshape(v[size:], shape).astype(numpy.float32))
+            value, (g_real, g_imag) = value_and_gradients()
+            last['value'] = float(value)
+            return last['value'], numpy.concatenate([numpy.ravel(g_real), numpy.ravel(g_imag)]).astype(numpy.float64)
+
+        x0 = numpy.concatenate([numpy.ravel(real.numpy()), numpy.ravel(imag.numpy())]).astype(numpy.float64)
+        res = minimize(fun, x0, jac=True, method='L-BFGS-B', options={'maxiter': iterations},
+                       callback=lambda _: record(last['value']))
+        fun(res.x)
@@ -1,59 +1,486 @@
+from itertools import product
+import copy
+import logging
+import time
+import numpy
+
+logger = logging.getLogger(__name__)
+
+# Default relaxation parameter of each algorithm.
+ALGORITHMS = {'gs': None, 'hio': 0.7, 'raar': 0.2, 'momentum': 0.5}
+
+
+def _schedule(schedule, iterations):
+    # Validates a pyramid schedule of (factor, iterations) levels; without one all iterations run at full resolution.
+    if schedule is None:
+        return [(1, iterations)]
+    factors = [int(f) for f, _ in schedule]
+    if factors[-1] != 1 or any(f <= g or f % g for f, g in zip(factors, factors[1:])):
+        raise ValueError("Schedule factors must decrease, divide the previous factor and end with 1.")
+    return schedule
+
 
 class MultiDistancePhaseOptimizer:
-    def __init__(self, solver):
+    def __init__(self, solver, algorithm='gs', beta=None):
         """
         Recovers the phase information by multiple intensity-only images captured from different distances.
 
+        Every algorithm alternates between two operators on the padded field x of the first plane: P_A replaces the
+        amplitude of x with the first measured amplitude, and P_B sweeps x through the other planes (replacing the
+        amplitude at each of them) and back to the first plane.
+
+            'gs':       x <- P_A(P_B(x)), the multi-distance Gerchberg–Saxton algorithm.
+            'hio':      x <- P_B(x) with the amplitude max((1 + β) a - β |P_B(x)|, 0), where a is the first measured
+                        amplitude. This is the input-output feedback of hybrid input-output applied to the amplitude
+                        constraint: the amplitude is pushed past the measured one by β times its misfit.
+            'raar':     x <- β/2 (R_A R_B + I) x + (1 - β) P_A(P_B(x)) with R = 2P - I, relaxed averaged alternating
+                        reflections anchored to Gerchberg–Saxton (β = 0) instead of to P_B.
+            'momentum': Gerchberg–Saxton from the extrapolated field x + β (x - x_previous). The momentum is dropped
+                        for one iteration whenever the error increases.
+
         Parameters
         ----------
-        solver : class(solvers.base.Solver)
-            The propagation solver class (e.g., AngularSpectrum) which encapsulates Solver.solve(input_, *args) to
-            apply propagation algorithm on the input field.
+        solver : class(solvers.AngularSpectrum.AngularSpectrumSolver)
+            The angular spectrum solver whose padding, transfer functions and backend are used to propagate the field
+            between the acquisition planes.
+
+        algorithm : string
+            'gs', 'hio', 'raar' or 'momentum'. Default is 'gs'.
+
+        beta : float (Optional)
+            Relaxation parameter of the algorithm. Default is 0.7 for 'hio', 0.2 for 'raar' and 0.5 for 'momentum'.
+
+        Stability: measured amplitudes are rarely consistent with the propagation model. With padding="same", for
+        example, the light leaving the window is cut at every plane, so the error of Gerchberg–Saxton levels off above
+        zero. On such data the textbook field-domain forms diverge for any β, and a tiny change of the input images
+        changes their result by O(1). Those forms are HIO (x + P_A((1 + β) P_B(x) - x) - β P_B(x)) and RAAR with
+        (1 - β) P_B(x), and they are not used here. The variants above stay stable, but a larger β still diverges:
+        'hio' above about β = 1 and 'raar' above about β = 0.4, measured on 64x64 fields with two to five planes. On
+        that 'same'-padded data, the defaults reach the error that Gerchberg–Saxton has after 100 iterations sooner:
+        'hio' 2-4 times sooner and 'raar' 1.1-1.4 times sooner.
         """
+        if algorithm not in ALGORITHMS:
+            raise ValueError("Unknown algorithm: {}. Expected one of {}.".format(algorithm, list(ALGORITHMS)))
         self.solver = solver
         self.backend = solver.backend
+        self.algorithm = algorithm
+        self.beta = ALGORITHMS[algorithm] if beta is None else beta
+        self.history = []
+        self.iterations_per_frame = []
+        self._levels = {}
+        # Unpadded first-plane estimate of the last call.
+        self._field = None
 
-    def optimize(self, image_seq, k, z_values, iterations=20):
+    def optimize(self, image_seq, k, z_values, iterations=20, tolerance=None, patience=None, min_delta=1e-4,
+                 callback=None, return_history=False, max_memory=None, schedule=None, initial_phase=None):
         """
-        Optimizes phase by Gerchberg–Saxton algorithm using multiple diversified acquisitions.
+        Optimizes phase by the chosen algorithm using multiple diversified acquisitions.
+
+        The transfer functions between consecutive planes are computed once per call (backward ones are their complex
+        conjugates), and the field is kept padded during the iterations, so each step is one FFT, one product, one
+        inverse FFT and one amplitude replacement.
+
+        After every iteration, the amplitude-consistency error ‖|u| - a‖ / ‖a‖ is computed on the first plane between
+        the back-propagated field u = P_B(x) and the measured amplitude a, before the amplitude is replaced. Progress is logged
+        to the "fringe.modules.PhaseRecovery" logger.
 
         Parameters
         ----------
         image_seq: array_like, list, ndarray - dtype: float32
-            Sequence of intensity-only images.
+            Sequence of intensity-only images. If the solver is batched, a (batch, planes, H, W) array of independent
+            image sequences which are recovered together.
+
+        k:  float
+            Wave number : 2πn/λ
+
+        z_values:   array-like, list
+            Axial sample-to-sensor distances of which each hologram was acquired from. If the solver is batched, either
+            shared by all sequences, or one row of distances per sequence with the shape (batch, planes).
+
+        iterations: int
+            Maximum number of iterations for optimization.
+
+        tolerance: float (Optional)
+            Stops when the error is not larger than tolerance. Default is None.
+
+        patience: int (Optional)
+            Stops when the error has not decreased by more than min_delta (relative) during the last patience
+            iterations. Default is None.
+
+        min_delta: float
+            Minimum relative decrease of the error which counts as progress. Default is 1e-4.
+
+        callback: callable (Optional)
+            Called after every iteration as callback(iteration, error, elapsed_seconds).
+
+        return_history: bool
+            If True, the list of per-iteration errors is returned along with the field. The history of the last call
+            is also kept in the "history" attribute. Default is False.
+
+        max_memory: int (Optional)
+            Batched solvers only. Upper bound in bytes for the working memory of the sequences recovered together. The
+            batch is split into chunks which fit and are recovered one after another. Default is None (one chunk).
+
+        schedule: list[tuple[int, int]] (Optional)
+            Coarse-to-fine pyramid as a list of (factor, iterations) levels, e.g. [(4, 30), (2, 10), (1, 5)]. Each
+            level recovers the images block-averaged by its factor with a solver of factor-times larger pixels (see
+            AngularSpectrumSolver.rescale), starting from the field of the previous level upsampled by repetition.
+            Factors must decrease and each one must divide the previous one. Replaces "iterations", and the stopping
+            criteria apply to every level separately. Default is None (a single full resolution level).
+
+        initial_phase: array_like, ndarray - dtype: float32 (Optional)
+            Initial phase estimate on the first plane with the shape of the images (one per sequence if the solver is
+            batched). Default is None (zero phase).
+
+        Batched recovery reports, for each iteration, the largest error among the sequences of a chunk, so early
+        stopping waits for the slowest sequence. The history is then a list of histories, one per chunk.
+
+        :return: The recovered complex field, and the error history if return_history is True.
+        """
+        schedule = _schedule(schedule, iterations)
+
+        if not self.solver.is_batched:
+            if len(image_seq) < 2:
+                raise ValueError("At least two images are required.")
+            result, self.history, self._field = self._recover_levels(
+                list(image_seq), k, z_values, schedule, initial_phase, tolerance=tolerance,
+                patience=patience, min_delta=min_delta, callback=callback)
+            return (result, self.history) if return_history else result
+
+        batch, n = image_seq.shape[0], image_seq.shape[1]
+        if n < 2:
+            raise ValueError("At least two images are required.")
+        z_values = numpy.asarray(z_values, dtype=numpy.float64)
+        if z_values.shape not in ((n,), (batch, n)):
+            raise ValueError("z_values must have the shape (planes,) or (batch, planes).")
+
+        chunk = self._chunk_size(batch, n, z_values.ndim == 2, max_memory)
+        results, fields, self.history = [], [], []
+        for i in range(0, batch, chunk):
+            stacks = image_seq[i:i + chunk]
+            result, history, field = self._recover_levels(
+                [stacks[:, j] for j in range(n)], k, z_values if z_values.ndim == 1 else z_values[i:i + chunk].T,
+                schedule, None if initial_phase is None else initial_phase[i:i + chunk],
+                tolerance=tolerance, patience=patience, min_delta=min_delta, callback=callback)
+            results.append(result)
+            fields.append(field)
+            self.history.append(history)
+        if len(results) == 1:
+            result, self._field = results[0], fields[0]
+        else:
+            result, self._field = self.backend.concat(results, axis=0), self.backend.concat(fields, axis=0)
+        return (result, self.history) if return_history else result
+
+    def recover_stream(self, frames, k, z_values, iterations=20, tolerance=None, relative_tolerance=1.05,
+                       patience=None, min_delta=1e-4, schedule=None, max_memory=None):
+        """
+        Recovers a stream of image sequences, e.g. the frames of a time-lapse acquisition, one frame at a time. Each
+        frame starts from the first-plane phase recovered for the previous frame, so frames which differ only slightly
+        converge in a few iterations. The number of iterations spent on each frame is appended to the
+        "iterations_per_frame" attribute and logged.
+
+        Parameters
+        ----------
+        frames: iterable
+            Image sequences in the format accepted by "optimize", e.g. a generator reading them from disk.
 
         k:  float
             Wave number : 2πn/λ
 
         z_values:   array-like, list
-            Axial sample-to-sensor distances of which each hologram was acquired from.
+            Axial sample-to-sensor distances, shared by all frames.
 
         iterations: int
-            Number of iterations for optimization.
+            Maximum number of iterations per frame.
+
+        tolerance: float (Optional)
+            Error at which a frame is considered consistent. Default is None, which uses the error the first frame
+            converged to, multiplied by relative_tolerance.
+
+        relative_tolerance: float
+            See tolerance. None disables the tolerance derived from the first frame. Default is 1.05.
+
+        patience: int (Optional)
+            Plateau criterion, see "optimize". Default is None.
+
+        min_delta: float
+            Plateau criterion, see "optimize". Default is 1e-4.
+
+        schedule: list[tuple[int, int]] (Optional)
+            Pyramid schedule of the first (cold started) frame, see "optimize". Default is None.
+
+        max_memory: int (Optional)
+            Batched solvers only, see "optimize". Default is None.
+
+        :return: A generator yielding the recovered complex field of each frame.
         """
-        recovered_field = image_seq[0]
+        self.iterations_per_frame = []
+        phase = None
+        for i, frame in enumerate(frames):
+            result, history = self.optimize(frame, k, z_values, iterations, tolerance=tolerance, patience=patience,
+                                            min_delta=min_delta, return_history=True, max_memory=max_memory,
+                                            schedule=schedule if phase is None else None, initial_phase=phase)
+            # Batched solvers give one history per chunk.
+            histories = history if self.solver.is_batched else [history]
+            if tolerance is None and relative_tolerance is not None:
+                tolerance = max(h[-1] for h in histories) * relative_tolerance
+            self.iterations_per_frame.append(max(len(h) for h in histories))
+            logger.info("frame: %d, iterations: %d", i, self.iterations_per_frame[-1])
+
+            phase = self.backend.angle(self._field)
+            yield result
+
+    def _chunk_size(self, batch, planes, per_sequence_z, max_memory):
+        if max_memory is None:
+            return batch
+        elements = int(numpy.prod(self.solver.padded_shape))
+        # Amplitude constraints and about six complex working fields per sequence, plus the per-sequence transfer
+        # functions (forward, backward and the final one) if the distances differ between sequences.
+        per_sequence = elements * (4 * planes + 8 * 6 + (8 * (2 * planes - 1) if per_sequence_z else 0))
+        return int(max(1, min(batch, max_memory // per_sequence)))
+
+    def _recover_levels(self, image_seq, k, z_values, schedule, initial_phase, **stopping):
+        b = self.backend
+        dims = self.solver.data_length
+        field = None
+        if initial_phase is not None:
+            field = b.exp(b.complex(b.zeros_like(initial_phase), initial_phase))
 
+        history, previous = [], 1
+        for factor, iterations in schedule:
+            level = self._level(factor)
+            images = image_seq if factor == 1 else [_block_mean(img, factor, dims) for img in image_seq]
+            if field is not None:
+                if previous < factor:
+                    field = _block_mean(field, factor // previous, dims)
+                elif previous > factor:
+                    field = _upsample(b, field, previous // factor, dims, images[0].shape)
+            x, h = level._recover(images, k, z_values, iterations, initial=field, **stopping)
+            history += h
+            field, previous = b.unpad(x, level.solver.padding), factor
+
+        # The border of x holds the pad fill value, so this equals solving the unpadded field. "field" is a view of x,
+        # so x must not be overwritten by the FFT.
+        result = b.unpad(level._propagate(x, level.solver.transfer_function(k, z_values[0]), overwrite=False),
+                         level.solver.padding)
+        return result, history, field
+
+    def _level(self, factor):
+        if factor == 1:
+            return self
+        if factor not in self._levels:
+            level = copy.copy(self)
+            level.solver = self.solver.rescale(factor)
+            level._levels = {}
+            self._levels[factor] = level
+        return self._levels[factor]
+
+    def _coupling(self, k, z_values):
+        # An optional operator applied to the first-plane field at the start of every iteration.
+        return None
+
+    def _recover(self, image_seq, k, z_values, iterations, initial=None, tolerance=None, patience=None,
+                 min_delta=1e-4, callback=None):
+        solver = self.solver
+        b = self.backend
+        n = len(image_seq)
+
+        # Padded amplitude constraints have a zero border, so the pad fill value is restored by adding 'border'.
+        amplitudes = [b.pad(b.abs(img), solver.padding, 0) for img in image_seq]
+        border = b.pad(image_seq[0] * 0, solver.padding, solver.pad_fill_value) if solver.pad_fill_value != 0 else None
+        norm = numpy.sqrt(numpy.asarray(b.reduce_sum(amplitudes[0] * amplitudes[0], axis=tuple(solver.data_dim))))
+
+        # P(-dz) = conj(P(dz)) holds for both the propagating and the evanescent part of the propagator. With one
+        # distance per sequence, z_values[j] is a vector and the solver builds a batch of transfer functions.
+        forward = [solver.transfer_function(k, z_values[j] - z_values[j + 1]) for j in range(n - 1)]
+        backward = [b.conj(tf) for tf in forward]
+
+        algorithm, beta = self.algorithm, self.beta
+        history = []
+        start = time.perf_counter()
+        if initial is None:
+            x = b.pad(image_seq[0], solver.padding, solver.pad_fill_value)
+        else:
+            x = self._project(b.pad(initial, solver.padding, solver.pad_fill_value), amplitudes[0], border)
+        x_prev = None
+        coupling = self._coupling(k, z_values)
         for i in range(iterations):
+            if coupling is not None:
+                x = coupling(x)
+            y = x + beta * (x - x_prev) if algorithm == 'momentum' and x_prev is not None else x
+            # The sweep may consume its input unless the iterate is needed by the update.
+            u = self._sweep(y, forward, backward, amplitudes, border,
+                            overwrite=algorithm in ('gs', 'hio') or y is not x)
+            error = self._error(u, amplitudes[0], norm)
+
+            if algorithm == 'hio':
+                feedback = (1 + beta) * amplitudes[0] - beta * b.abs(u)
+                # max(feedback, 0) with backend-agnostic operations.
+                x = self._project(u, (feedback + b.abs(feedback)) / 2, border)
+            elif algorithm == 'raar':
+                # β/2 (2 P_A(2u - x) - (2u - x) + x) + (1 - β) P_A(u); the last projection runs in place on u.
+                x = beta * self._project(2 * u - x, amplitudes[0], border) + beta * (x - u)
+                x = x + (1 - beta) * self._project(u, amplitudes[0], border)
+            else:
+                x_prev = None if algorithm == 'momentum' and history and error > history[-1] else x
+                x = self._project(u, amplitudes[0], border)
+
+            history.append(error)
+            elapsed = time.perf_counter() - start
             if i % 5 == 0:
-                print("step:", i)
-
-            for j in range(len(image_seq) - 1):
-                dz = z_values[j] - z_values[j + 1]
-                img = image_seq[j + 1]
-                rec = self.solver.solve(recovered_field, k, dz)
-                phase = self.backend.exp(self.backend.complex(
-                    real=self.backend.zeros_like(rec, dtype='float32'),
-                    imag=self.backend.angle(rec)))
-                recovered_field = self.backend.multiply(img, phase)
-
-            last_i = len(image_seq) - 1
-            for j in range(len(image_seq) - 1):
-                dz = z_values[last_i - j] - z_values[last_i - j - 1]
-                img = image_seq[last_i - j - 1]
-                rec = self.solver.solve(recovered_field, k, dz)
-                phase = self.backend.exp(self.backend.complex(
-                    real=self.backend.zeros_like(rec, dtype='float32'),
-                    imag=self.backend.angle(rec)))
-                recovered_field = self.backend.multiply(img, phase)
-
-        return self.solver.solve(recovered_field, k, z_values[0])
+                logger.info("step: %d, error: %.4e, elapsed: %.2fs", i, error, elapsed)
+            if callback is not None:
+                callback(i, error, elapsed)
+
+            if tolerance is not None and error <= tolerance:
+                logger.info("converged at step %d, error: %.4e", i, error)
+                break
+            if patience is not None and len(history) > patience and \
+                    history[-patience - 1] - min(history[-patience:]) <= min_delta * history[-patience - 1]:
+                logger.info("plateau reached at step %d, error: %.4e", i, error)
+                break
+
+        if algorithm in ('hio', 'raar') and history:
+            # The iterate itself is not amplitude-consistent; the estimate is its projection.
+            x = self._project(u, amplitudes[0], border)
+        return x, history
+
+    def _sweep(self, field, forward, backward, amplitudes, border, overwrite=True):
+        """
+        Propagates the field of the first plane through the other planes and back, replacing the amplitude at every
+        plane but the first one.
+        """
+        n = len(amplitudes)
+        if n == 1:
+            return field
+        for j in range(n - 1):
+            field = self._project(self._propagate(field, forward[j], overwrite or j > 0), amplitudes[j + 1], border)
+        for j in reversed(range(1, n - 1)):
+            field = self._project(self._propagate(field, backward[j]), amplitudes[j], border)
+        return self._propagate(field, backward[0])
+
+    def _propagate(self, field, tf, overwrite=True):
+        b = self.backend
+        dims = self.solver.data_length
+        return b.ifft(tf * b.fft(field, dims, overwrite_input=overwrite), dims, overwrite_input=True)
+
+    def _project(self, field, amplitude, border):
+        field = self.backend.replace_amplitude(field, amplitude)
+        return field if border is None else field + border
+
+    def _error(self, field, amplitude, norm):
+        b = self.backend
+        diff = b.unpad(b.abs(field), self.solver.padding) - b.unpad(amplitude, self.solver.padding)
+        # The largest error among the sequences of a batch.
+        return float(numpy.max(numpy.sqrt(numpy.asarray(b.reduce_sum(diff * diff, axis=tuple(self.solver.data_dim)))) / norm))
+
+
+class MultiWavelengthPhaseOptimizer(MultiDistancePhaseOptimizer):
+    def __init__(self, solver, algorithm='gs', beta=None):
+        """
+        Recovers the phase information by intensity-only images of the same sample captured under multiple wavelengths,
+        optionally each from multiple distances. Wavelength channels are the batch dimension of the solver, each with
+        its own wave number, so every propagation of all channels is a single batched FFT.
+
+        At the start of every iteration, the fields of all channels are propagated to the object plane, where a thin
+        sample gives each channel a phase of k_c · (optical path difference). The phases are rescaled to the smallest
+        wave number, summed as phasors weighted by the amplitudes, and the common phase is rescaled back to each channel
+        before propagating to the first plane. Multi-distance iterations (see MultiDistancePhaseOptimizer) follow.
+        The phase scaling is unambiguous while the object phase of the shortest wavelength stays within (-π, π], and
+        dispersion of the sample is neglected.
+
+        Parameters
+        ----------
+        solver : class(solvers.AngularSpectrum.AngularSpectrumSolver)
+            A batched angular spectrum solver, whose batch dimension holds the wavelength channels.
+
+        algorithm : string
+            See MultiDistancePhaseOptimizer. Default is 'gs'.
+
+        beta : float (Optional)
+            See MultiDistancePhaseOptimizer.
+        """
+        if not solver.is_batched:
+            raise ValueError("Wavelength channels are the batch dimension, so a batched solver is required.")
+        super().__init__(solver, algorithm, beta)
+
+    def optimize(self, image_seq, k, z_values, iterations=20, tolerance=None, patience=None, min_delta=1e-4,
+                 callback=None, return_history=False, schedule=None, initial_phase=None):
+        """
+        Optimizes phase using acquisitions diversified by wavelength and optionally by distance.
+
+        Parameters
+        ----------
+        image_seq: array_like, ndarray - dtype: float32
+            Intensity-only images with the shape (channels, H, W), or (channels, planes, H, W) for multiple distances.
+
+        k:  array_like
+            Wave number 2πn/λ of each channel.
+
+        z_values:   float, array-like
+            Axial sample-to-sensor distance of the images, a list of distances shared by all channels, or one row of
+            distances per channel with the shape (channels, planes).
+
+        Other parameters are the same as in MultiDistancePhaseOptimizer.optimize.
+
+        :return: The recovered complex field of each channel at the object plane, and the error history if
+            return_history is True.
+        """
+        channels = image_seq.shape[0]
+        k = numpy.asarray(k, dtype=numpy.float64).reshape(-1)
+        if k.shape != (channels,):
+            raise ValueError("One wave number per channel is required.")
+        if len(image_seq.shape) == len(self.solver.padding):
+            image_seq = image_seq[:, None]
+
+        n = image_seq.shape[1]
+        z_values = numpy.asarray(z_values, dtype=numpy.float64)
+        if z_values.ndim == 0:
+            z_values = z_values.reshape(1)
+        if z_values.shape not in ((n,), (channels, n)):
+            raise ValueError("z_values must have the shape (planes,) or (channels, planes).")
+
+        schedule = _schedule(schedule, iterations)
+
+        result, self.history, self._field = self._recover_levels(
+            [image_seq[:, j] for j in range(n)], k, z_values if z_values.ndim == 1 else z_values.T,
+            schedule, initial_phase, tolerance=tolerance, patience=patience, min_delta=min_delta,
+            callback=callback)
+        return (result, self.history) if return_history else result
+
+    def _coupling(self, k, z_values):
+        b = self.backend
+        to_object = self.solver.transfer_function(k, z_values[0])
+        to_plane = b.conj(to_object)
+        # Phase of each channel relative to the phase of the smallest wave number.
+        ratio = b.convert(numpy.reshape(k / numpy.min(k), (-1, 1, 1)), dtype='float32')
+
+        def couple(x):
+            field = self._propagate(x, to_object)
+            amplitude = b.abs(field)
+            zeros = b.zeros_like(amplitude)
+            combined = b.reduce_sum(b.complex(amplitude, zeros) * b.exp(b.complex(zeros, b.angle(field) / ratio)), axis=0)
+            phase = b.angle(combined) * ratio
+            return self._propagate(b.complex(amplitude, zeros) * b.exp(b.complex(zeros, phase)), to_plane)
+
+        return couple
+
+
+def _block_mean(x, factor, dims):
+    # Averages factor x factor blocks over the last 'dims' axes. Trailing rows and columns which do not fill a block
+    # are dropped, like the "//" of AngularSpectrumSolver.rescale.
+    lead = [slice(None)] * (len(x.shape) - dims)
+    total = None
+    for offset in product(range(factor), repeat=dims):
+        index = tuple(lead + [slice(o, (n // factor) * factor, factor) for o, n in zip(offset, x.shape[-dims:])])
+        total = x[index] if total is None else total + x[index]
+    return total / factor ** dims
+
+
+def _upsample(backend, x, factor, dims, shape):
+    # Repeats each element factor times along the last 'dims' axes, then pads up to 'shape' with ones (zero phase).
+    ndim = len(x.shape)
+    for axis in range(ndim - dims, ndim):
+        x = backend.repeat(x, factor, axis)
+    padding = [[0, 0]] * (ndim - dims) + [[0, t - n] for t, n in zip(shape[-dims:], x.shape[-dims:])]
+    return backend.pad(x, padding, 1)
@@ -1,9 +1,10 @@
 import numpy as np
 from ..utils.io import export_image
+from ..solvers.base import sweep
 import os
 
 
-def scan_z(input_field, k, z_range, dz, solver, export_dir):
+def scan_z(input_field, k, z_range, dz, solver, export_dir, exporter=None):
     """
     Scans the z axis within the specified range with the specified dz resolution and saves the propagated images in the
     given directory. This method is suitable to find the focus plane of a hologram.
@@ -22,13 +23,17 @@ def scan_z(input_field, k, z_range, dz, solver, export_dir):
     dz : float
         Step size of scanning.
 
-    solver : class(solvers.base.Solver)
-        The propagation solver class which encapsulates Solver.solve(input_, *args) to apply propagation
-        algorithm on the input field.
+    solver : class(solvers.AngularSpectrum.AngularSpectrumSolver)
+        The propagation solver class which encapsulates sweep(input_, k, z0, dz, count) to propagate the input field
+        to every scanned plane with a single forward FFT. Solvers without it are called plane by plane with solve.
 
     export_dir : string
         Output directory to export images.
 
+    exporter : class(utils.io.AsyncExporter) (Optional)
+        Background exporter which writes the images while the next planes are propagated. The caller flushes or closes
+        it. Default is None, which exports synchronously.
+
     Example
     ----------
     >>> field = np.zeros((128, 128)).astype('complex64')
@@ -38,12 +43,17 @@ def scan_z(input_field, k, z_range, dz, solver, export_dir):
 
     :return: Saves the reconstructed images in the given directory with the order of their heights.
     """
-    np.abs()
     obj = input_field + 0j
     zs = list(range(z_range[0], z_range[1], dz))
-    for i, z in enumerate(zs):
-        res_amp = np.abs(solver.solve(obj, k, z))
+    if not zs:
+        return
+    for i, (z, res) in enumerate(zip(zs, sweep(solver, obj, k, zs[0], dz, len(zs)))):
+        res_amp = np.abs(res)
         # res_phase = unwrap_phase(np.angle(solvers.reconstruct(obj, z)))
         res_amp /= np.max(res_amp)
         res_amp *= 255
-        export_image(res_amp, os.path.join(export_dir, str(i) + '_' + str(z) + '.png'))
+        path = os.path.join(export_dir, str(i) + '_' + str(z) + '.png')
+        if exporter is not None:
+            exporter.export(res_amp, path)
+        else:
+            export_image(res_amp, path)
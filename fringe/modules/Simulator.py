@@ -1,9 +1,10 @@
 import numpy as np
 import os
-from ..utils.io import export_image
+from ..utils.io import export_image, load_stack, StackWriter
+from ..solvers.base import sweep
 
 
-def simulate_multiple(input_field, k, z, dz, count, solver, export_path):
+def simulate_multiple(input_field, k, z, dz, count, solver, export_path, exporter=None):
     """
     Simulates a sequence of holograms by propagating a complex_valued tensor to a series of heights.
 
@@ -24,13 +25,17 @@ def simulate_multiple(input_field, k, z, dz, count, solver, export_path):
     count: int
         The number of holograms with unique heights.
 
-    solver : class(solvers.base.Solver)
-        The propagation solver class which encapsulates Solver.solve(input_, *args) to apply propagation
-        algorithm on the input field.
+    solver : class(solvers.AngularSpectrum.AngularSpectrumSolver)
+        The propagation solver class which encapsulates sweep(input_, k, z0, dz, count) to propagate the input field
+        to every height with a single forward FFT. Solvers without it are called plane by plane with solve.
 
     export_path : string
         Path of the output image with a name and extension. If None, doesn't export. Default is None.
 
+    exporter : class(utils.io.AsyncExporter) (Optional)
+        Background exporter which writes the holograms while the next ones are simulated. The caller flushes or closes
+        it. Default is None, which exports synchronously.
+
     Example
     ----------
     >>> field = np.zeros((128, 128)).astype('complex64')
@@ -38,14 +43,90 @@ def simulate_multiple(input_field, k, z, dz, count, solver, export_path):
     >>> solver = AngularSpectrumSolver(shape=obj.shape, dr=2, padding=None, backend="numpy")
     >>> simulate_multiple(field, 2*PI/500e-3, 300, 5, solver, '~/OUT_DIR')
 
-    :return: Saves and returns the propagated holograms in the specified directory.
+    :return: Saves and returns the propagated holograms in the specified directory. All holograms are kept in memory,
+        see simulate_stream and simulate_to_disk for large counts.
     """
 
     hs = []
-    for i in range(count):
-        z_ = z + i * dz
-        h = np.square(np.abs(solver.solve(input_field, k, z_)))
+    zs = [z + i * dz for i in range(count)]
+    for i, (z_, h) in enumerate(zip(zs, simulate_stream(input_field, k, z, dz, count, solver))):
         hs.append(h)
         if export_path is not None:
-            export_image(h, os.path.join(export_path, str(i) + '_' + str(z_) + '.tif'), dtype='uint16')
+            path = os.path.join(export_path, str(i) + '_' + str(z_) + '.tif')
+            if exporter is not None:
+                exporter.export(h, path, dtype='uint16')
+            else:
+                export_image(h, path, dtype='uint16')
     return hs
+
+
+def simulate_stream(input_field, k, z, dz, count, solver, batch_size=None):
+    """
+    Simulates a sequence of holograms lazily. Only the holograms of the current step are held in memory, whatever the
+    count is.
+
+    Parameters
+    ----------
+    input_field :  array_like - dtype: complex64
+        The input complex field.
+
+    k: float
+        Wave number
+
+    z : float
+        Hologram plane.
+
+    dz : float
+        delta-height for each step.
+
+    count: int
+        The number of holograms with unique heights.
+
+    solver : class(solvers.AngularSpectrum.AngularSpectrumSolver)
+        The propagation solver.
+
+    batch_size : int (Optional)
+        Number of planes propagated together by one batched inverse FFT (solver.solve_many). Default is None, which
+        propagates plane by plane with the transfer function recurrence of solver.sweep.
+
+    Example
+    ----------
+    >>> for i, h in enumerate(simulate_stream(field, 2*PI/500e-3, 300, 5, 10000, solver, batch_size=8)):
+    ...     process(h)
+
+    :return: A generator yielding the hologram (intensity) of each height in order.
+    """
+    if batch_size is None:
+        planes = sweep(solver, input_field, k, z, dz, count)
+    else:
+        planes = solver.solve_many(input_field, k, [z + i * dz for i in range(count)], batch_size=batch_size,
+                                   as_generator=True)
+    for res in planes:
+        yield np.square(np.abs(res))
+
+
+def simulate_to_disk(input_field, k, z, dz, count, solver, path, batch_size=None, dtype='float32'):
+    """
+    Simulates a sequence of holograms straight into a (count, H, W) stack in a .npy file (see utils.io.StackWriter).
+    Holograms are appended to the file as they are computed, so the memory use does not grow with the count.
+
+    Parameters
+    ----------
+    input_field, k, z, dz, count, solver, batch_size :
+        See simulate_stream.
+
+    path : string
+        Path of the output .npy file. Pixel size, wavelength and heights are saved in a .json file next to it.
+
+    dtype : string, dtype
+        Data type of the stored holograms. Default is 'float32'.
+
+    :return: The stack as a read-only memory map (see utils.io.load_stack), whose pages are read on access.
+    """
+    zs = [z + i * dz for i in range(count)]
+    dr = solver.geometry[2] if hasattr(solver, 'geometry') else solver.dr
+    with StackWriter(path, count, input_field.shape, dtype, dr=list(dr), wavelength=2 * np.pi / k,
+                     z_values=zs) as writer:
+        for h in simulate_stream(input_field, k, z, dz, count, solver, batch_size):
+            writer.append(h)
+    return load_stack(path)[0]
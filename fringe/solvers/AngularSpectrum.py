@@ -1,14 +1,67 @@
 from typing import Union
 from . import base
+from .cache import TransferFunctionCache, is_cacheable, DEFAULT_MAX_BYTES
+from ..backend import get_backend
 from ..backend.core import CoreFunctions
 from ..backend.Numpy import Numpy
-from ..backend.TensorFlow import TensorFlow
+import numbers
 import numpy
 _PI = numpy.pi
 
 
+def resolve_backend(backend):
+    """
+    :return: The backend class for a registered backend name (see backend.get_backend) or a class inherited from
+        backend.core.CoreFunctions.
+    """
+    if isinstance(backend, str):
+        return get_backend(backend)
+    elif isinstance(backend, type) and issubclass(backend, CoreFunctions):
+        return backend
+    else:
+        raise ValueError("The given backend is not an instance of backend.core.CoreFunctions or is not one of the "
+                         "built-in classes.")
+
+
+def diffraction_margin(k, z, dr):
+    """
+    Number of pixels the sampled band spreads laterally over a propagation distance z. With this margin on both sides
+    of an axis, the band limit of AngularSpectrumSolver.band_limit_mask keeps the whole sampled band (|k_t| < π/dr)
+    and the propagated field does not wrap around the padded window.
+
+    Parameters
+    ----------
+    k:  float
+        Wave number : 2πn/λ
+
+    z:  float
+        Axial propagation distance.
+
+    dr: float
+        Pixel size along the axis.
+
+    :return: The margin in pixels, or None if the pixel size is not larger than λ/2, where the sampled band includes
+        grazing angles and the spread is unbounded.
+    """
+    r = k * dr / _PI
+    if r <= 1:
+        return None
+    return int(numpy.ceil(abs(z) / (dr * numpy.sqrt(r * r - 1))))
+
+
+def _as_vector(value):
+    # Python/numpy scalars and 1D sequences of them as a float64 vector, None for tensors and other values.
+    if isinstance(value, (list, tuple, numpy.ndarray, numbers.Real)):
+        vector = numpy.asarray(value, dtype=numpy.float64)
+        if vector.ndim <= 1:
+            return vector.reshape(-1)
+    return None
+
+
 class AngularSpectrumSolver(base.Solver):
-    def __init__(self, shape, dr: Union[float, tuple, list], is_batched, padding: Union[str, list, None] = None, pad_fill_value=0, backend='TensorFlow'):
+    def __init__(self, shape, dr: Union[float, tuple, list], is_batched, padding: Union[str, list, None] = None, pad_fill_value=0, backend='TensorFlow',
+                 cache: Union[int, TransferFunctionCache, None] = 8, cache_max_bytes=DEFAULT_MAX_BYTES, reuse_buffers=False,
+                 guard_band=None):
         """
         Angular Spectrum Solver class. On initialization, static parameters are defined. To propagate fields, call the
         "solve" method.
@@ -26,24 +79,41 @@ class AngularSpectrumSolver(base.Solver):
 
         padding : string, array_like, list[list[float]], ndarray
             An array storing the number of pixels to pad from the edges on each axis. It can be
-            simply set as "SAME" to double the area of the input tensor by constant values. Default is None.
+            simply set as "SAME" to double the area of the input tensor by constant values. "FAST" rounds each padded
+            length up to the next length the backend FFT handles fast (2/3/5/7-smooth), starting from the "SAME" size or,
+            if guard_band is given, from the smallest alias-free size. The chosen shape is stored in "padded_shape".
+            Default is None.
             Supported array format for a 2D field is [(before_0, after_0), (before_1, after_1)]
 
         pad_fill_value : float
             Constant fill value for padding. Default is 0.
 
         backend : string, class(backend.core.CoreFunctions)
-            Computation backend. "tensorflow" and "numpy" are built in backends. Any custom class inherited
-             from backend.core.CoreFunctions could be compatible as well.
-        """
-        if isinstance(backend, str):
-            self.backend = {'tensorflow': TensorFlow,
-                            'numpy': Numpy}[backend.lower()]
-        elif issubclass(backend, CoreFunctions):
-            self.backend = backend
-        else:
-            raise ValueError("The given backend is not an instance of backend.core.CoreFunctions or is not one of the "
-                             "built-in classes.")
+            Computation backend. "tensorflow", "numpy", "scipy" and "fftw" are built in backends, imported on first use.
+            Any custom class inherited from backend.core.CoreFunctions could be compatible as well, and could be
+            registered by name with backend.register_backend.
+
+        cache : int, TransferFunctionCache, None
+            Maximum number of transfer functions kept in an LRU cache keyed by (k, z), or a TransferFunctionCache
+            instance to share between solvers. None or 0 disables caching. Default is 8.
+
+        cache_max_bytes : int
+            Maximum total size of the cached transfer functions in bytes. Ignored if a TransferFunctionCache instance
+            is given. None means unbounded. Default is 256 MiB.
+
+        reuse_buffers : bool
+            If True, "solve" runs in preallocated padded and spectrum buffers which are kept between calls, and
+            returns a view of the spectrum buffer unless an "out" array is given. Only supported by the Numpy based
+            backends. Default is False.
+
+        guard_band : tuple (k, z_max) (Optional)
+            Wave number and the largest absolute propagation distance to be solved for. With padding="FAST", each axis
+            gets at least the guard band given by "diffraction_margin" on both sides. Default is None.
+        """
+        self.backend = resolve_backend(backend)
+
+        if reuse_buffers and not issubclass(self.backend, Numpy):
+            raise ValueError("Buffer reuse is only supported by the Numpy based backends.")
 
         if len(shape) > 2 and not is_batched:
             raise ValueError("More than 2-dimensional data structure is not supported without a batch dimension.")
@@ -57,6 +127,8 @@ class AngularSpectrumSolver(base.Solver):
                 raise ValueError("Padding must have the same length as the data dimensions. For each data dimension "
                                  "(except batch) a pad array must be defined.")
 
+        self.shape = tuple(shape)
+        self.is_batched = is_batched
         self.pad_fill_value = pad_fill_value
         self.padding = []
         self.dr = []
@@ -67,15 +139,18 @@ class AngularSpectrumSolver(base.Solver):
 
         for i, s in enumerate(shape):
             if i != 0 or not is_batched:
+                self.dr += [dr] if (type(dr) is float or type(dr) is int) else [dr[i - (1 if is_batched else 0)]]
+
                 if type(padding) == str:
                     if padding.lower() == "same":
                         self.padding += [[s // 2] * 2]
+                    elif padding.lower() == "fast":
+                        self.padding += [self._fast_padding(s, self.dr[-1], guard_band)]
                 elif type(padding) in [list, tuple]:
-                    self.padding += padding[i]
+                    self.padding += [list(padding[i - (1 if is_batched else 0)])]
                 else:
                     self.padding += [[0, 0]]
 
-                self.dr += [dr] if (type(dr) is float or type(dr) is int) else [dr[i]]
                 self.shape_f.append(shape[i] + self.padding[i][0] + self.padding[i][1])
                 self.data_dim.append(i)
                 self.data_length += 1
@@ -83,6 +158,17 @@ class AngularSpectrumSolver(base.Solver):
             elif i == 0 and is_batched:
                 self.padding += [[0, 0]]
 
+        self.padded_shape = tuple(self.shape_f)
+
+        # Transfer functions depend on the grid only through these values. The backend sets the tensor type.
+        self.geometry = (bool(is_batched), tuple(tuple(p) for p in self.padding),
+                         tuple(float(d) for d in self.dr), tuple(self.shape_f), self.backend)
+
+        if isinstance(cache, TransferFunctionCache):
+            self.cache = cache
+        else:
+            self.cache = TransferFunctionCache(max_entries=cache or 0, max_bytes=cache_max_bytes)
+
         kt = []
         for i in range(len(self.data_dim)):
             d = float(self.dr[i])
@@ -95,7 +181,8 @@ class AngularSpectrumSolver(base.Solver):
                 f_min = -((n - 1)/2) * u
                 f_max = ((n - 1)/2) * u
             k_min, k_max = f_min * 2 * _PI, f_max * 2 * _PI
-            kt.append(self.backend.fftshift(self.backend.linspace(k_min, k_max, n)))
+            # ifftshift moves the zero frequency to the first element for odd lengths as well.
+            kt.append(self.backend.ifftshift(self.backend.linspace(k_min, k_max, n)))
 
         kt_grid = self.backend.meshgrid(*kt, indexing='ij') if len(self.data_dim) > 1 else kt
         self.kt_abs = self.backend.convert(kt_grid, dtype='float32')
@@ -114,6 +201,37 @@ class AngularSpectrumSolver(base.Solver):
 
         self.t = 0
 
+        self.reuse_buffers = reuse_buffers
+        self._buffers = None
+        self.peak_bytes = 0
+
+    def rescale(self, factor):
+        """
+        Creates a solver for fields downsampled by an integer factor, e.g. by block averaging. Along every data axis
+        the length and the padding are divided by the factor and the pixel size is multiplied by it, so the physical
+        extent is kept. The batch dimension, the backend and the transfer function cache are shared.
+
+        Parameters
+        ----------
+        factor: int
+            Downsampling factor.
+
+        :return: A new AngularSpectrumSolver.
+        """
+        offset = 1 if self.is_batched else 0
+        shape = [s if i < offset else s // factor for i, s in enumerate(self.shape)]
+        padding = [[p[0] // factor, p[1] // factor] for p in self.padding[offset:]]
+        return AngularSpectrumSolver(shape, [d * factor for d in self.geometry[2]], self.is_batched, padding=padding,
+                                     pad_fill_value=self.pad_fill_value, backend=self.backend, cache=self.cache,
+                                     reuse_buffers=self.reuse_buffers)
+
+    def _fast_padding(self, n, dr, guard_band):
+        margin = diffraction_margin(guard_band[0], guard_band[1], dr) if guard_band is not None else None
+        if margin is None:
+            margin = n // 2
+        total = self.backend.next_fast_len(n + 2 * margin) - n
+        return [total // 2, total - total // 2]
+
     def band_limit_mask(self, k, z):
         """
         Band limit in the Fourier domain For Angular Spectrum.
@@ -157,33 +275,71 @@ class AngularSpectrumSolver(base.Solver):
 
         :return: Complex-valued free-space propagator tensor with the shape of the input tensor (independent of batch size).
         """
-        k2_kt2 = k * k - self.kt2
+        return self._propagator(k * k, z)
+
+    def _propagator(self, k2, z):
+        k2_kt2 = k2 - self.kt2
         sqk2_kt2 = self.backend.sqrt(self.backend.abs(k2_kt2))
         cs = self.backend.where(k2_kt2 >= 0,
-                                self.backend.complex(real=self.backend.zeros_like(self.kt2), imag=sqk2_kt2 * z),
-                                self.backend.complex(real=-sqk2_kt2 * self.backend.abs(z), imag=self.backend.zeros_like(self.kt2)))
+                                self.backend.complex(real=self.backend.zeros_like(sqk2_kt2), imag=sqk2_kt2 * z),
+                                self.backend.complex(real=-sqk2_kt2 * abs(z), imag=self.backend.zeros_like(sqk2_kt2)))
         return self.backend.exp(cs)
 
     def transfer_function(self, k, z):
         """
         Complex Optical Transfer Function (OTF) which here, is a low-pass filtered version of the propagator function.
+        For scalar k and z, results are served from the solver's LRU cache.
+
+        Batched solvers also accept a vector of k and/or z values, one per batch element. Repeated (k, z) pairs and the
+        pairs found in the cache are reused, the others are computed together by one broadcast evaluation.
 
         Parameters
         ----------
-        k: float
+        k: float, array_like
             Wave number : 2πn/λ
 
-        z: float
+        z: float, array_like
             Axial coordinate of the target plane.
 
-        :return: Complex-valued OTF tensor with the shape of the input tensor (independent of batch size).
+        :return: Complex-valued OTF tensor with the shape of the input tensor (independent of batch size, unless k or z
+            are vectors).
         """
+        if is_cacheable(k, z):
+            # Python floats do not promote the single precision grid, unlike numpy float64/int64 scalars.
+            k, z = float(k), float(z)
+            return self.cache.get((self.geometry, k, z), lambda: self._transfer_function(k, z))
+        if self.is_batched:
+            k_vector, z_vector = _as_vector(k), _as_vector(z)
+            if k_vector is not None and z_vector is not None:
+                return self._batch_transfer_function(*numpy.broadcast_arrays(k_vector, z_vector))
+        return self._transfer_function(k, z)
+
+    def _batch_transfer_function(self, k, z):
+        pairs = list(zip(k.tolist(), z.tolist()))
+        unique = list(dict.fromkeys(pairs))
+
+        def compute(keys):
+            # Broadcasting (n, 1, 1) values against the (1, H, W) grid gives n propagators at once. k^2 is rounded to
+            # single precision only after squaring, as for a python float k, so the cached entries match the scalar
+            # path exactly.
+            k2 = numpy.reshape([key[1] * key[1] for key in keys], (-1, 1, 1))
+            z_m = numpy.reshape([key[2] for key in keys], (-1, 1, 1))
+            tfs = self._propagator(self.backend.convert(k2, dtype='float32'), self.backend.convert(z_m, dtype='float32'))
+            return [tfs[i:i + 1] for i in range(len(keys))]
+
+        tfs = self.cache.get_many([(self.geometry, kk, zz) for kk, zz in unique], compute)
+        if len(unique) == 1:
+            return tfs[0]
+        index = {pair: i for i, pair in enumerate(unique)}
+        return self.backend.concat([tfs[index[pair]] for pair in pairs], axis=0)
+
+    def _transfer_function(self, k, z):
         #mask = self.band_limit_mask(k, z)
         p = self.propagator(k, z)
         #p_m = self.backend.where(mask > 0, p, 0)
         return p
 
-    def solve(self, input_, k, z):
+    def solve(self, input_, k, z, out=None):
         """
         Solves convolution of the complex input field with the angular spectrum optical transfer function for a given
         wave number k, and axial displacement z.
@@ -199,12 +355,202 @@ class AngularSpectrumSolver(base.Solver):
         z: float
             Axial coordinate of the target plane.
 
+        out: ndarray (Optional)
+            An array with the shape of the input to write the result into. Only supported by the Numpy based backends.
+
         :return: Complex-valued angular spectrum of the input field.
         """
         if len(input_.shape) != len(self.padding):
             raise ValueError("Input shape is incompatible.")
 
+        if self.reuse_buffers:
+            return self._solve_in_buffers(input_, k, z, out)
+
         field = self.backend.pad(input_, self.padding, self.pad_fill_value)
 
         tf = self.transfer_function(k, z)
-        return self.backend.unpad(self.backend.ifft(tf * self.backend.fft(field, self.data_length), self.data_length), self.padding)
+        # The padded field and the product are temporaries, so backends may transform them in place.
+        spectrum = self.backend.fft(field, self.data_length, overwrite_input=True)
+        result = self.backend.unpad(self.backend.ifft(tf * spectrum, self.data_length, overwrite_input=True), self.padding)
+        if out is not None:
+            out[...] = result
+            return out
+        return result
+
+    def compile(self, jit_compile=False, dtype='complex64'):
+        """
+        Traces "solve" (padding, propagator, transforms and unpadding) into a single compiled function with a fixed
+        input signature. k and z are float32 scalar inputs of the function (other floats are cast), so they may change
+        between calls without retracing. The batch size of a batched solver is left unspecified. Only the TensorFlow
+        backend compiles (tf.function), other backends return an uncompiled function.
+
+        Transfer functions are evaluated inside the compiled function and are not cached.
+
+        Parameters
+        ----------
+        jit_compile: bool
+            If True, the function is compiled with XLA. Default is False.
+
+        dtype: string
+            Data type of the input field. Default is 'complex64'.
+
+        :return: A function f(input_, k, z) returning the propagated field.
+        """
+        shape = (None,) + self.shape[1:] if self.is_batched else self.shape
+        return self.backend.compile(self._solve_traced, shape, dtype, jit_compile=jit_compile)
+
+    def _solve_traced(self, input_, k, z):
+        field = self.backend.pad(input_, self.padding, self.pad_fill_value)
+        spectrum = self.backend.fft(field, self.data_length)
+        return self.backend.unpad(self.backend.ifft(self._transfer_function(k, z) * spectrum, self.data_length),
+                                  self.padding)
+
+    def adjoint(self, input_, k, z):
+        """
+        Adjoint (conjugate transpose) of the linear map input_ -> solve(input_, k, z) with a zero pad fill value. The
+        unpadding becomes zero padding and the transfer function is conjugated, which equals propagating by -z, while
+        the cached transfer function of z is reused. This is the gradient of a real loss with respect to the input
+        field of "solve", given the gradient with respect to its output.
+
+        Parameters
+        ----------
+        input_: ndarray, tensor - dtype: complex64
+            Complex field with the output shape of "solve".
+
+        k: float
+            Wave number : 2πn/λ
+
+        z: float
+            Axial coordinate of the target plane of the forward propagation.
+
+        :return: Complex-valued field with the input shape of "solve".
+        """
+        if len(input_.shape) != len(self.padding):
+            raise ValueError("Input shape is incompatible.")
+
+        field = self.backend.pad(input_, self.padding, 0)
+        tf = self.backend.conj(self.transfer_function(k, z))
+        spectrum = self.backend.fft(field, self.data_length, overwrite_input=True)
+        return self.backend.unpad(self.backend.ifft(tf * spectrum, self.data_length, overwrite_input=True), self.padding)
+
+    def _solve_in_buffers(self, input_, k, z, out):
+        tf = self.transfer_function(k, z)
+        dtype = numpy.result_type(input_.dtype, tf.dtype)
+        shape = tuple(s + p[0] + p[1] for s, p in zip(input_.shape, self.padding))
+
+        if self._buffers is None or self._buffers[0].shape != shape or self._buffers[0].dtype != dtype:
+            # The border of the work buffer keeps the fill value, only the center is rewritten on each call.
+            self._buffers = (numpy.full(shape, self.pad_fill_value, dtype=dtype), numpy.empty(shape, dtype=dtype))
+        work, spectrum = self._buffers
+
+        self.backend.unpad(work, self.padding)[...] = input_
+        self.backend.fft(work, self.data_length, out=spectrum)
+        numpy.multiply(spectrum, tf, out=spectrum)
+        self.backend.ifft(spectrum, self.data_length, overwrite_input=True, out=spectrum)
+
+        # Bytes of the arrays alive during the call. Backends without native 'out' support hold one more spectrum.
+        self.peak_bytes = work.nbytes + spectrum.nbytes + tf.nbytes + (0 if self.backend.native_out else spectrum.nbytes)
+
+        result = self.backend.unpad(spectrum, self.padding)
+        if out is not None:
+            out[...] = result
+            return out
+        return result
+
+    def solve_many(self, input_, k, z_values, batch_size=None, as_generator=False):
+        """
+        Propagates the complex input field to multiple axial planes. The input is padded and Fourier transformed only
+        once, then batches of stacked transfer functions are applied and inverse transformed together.
+
+        Parameters
+        ----------
+        input_: ndarray, tensor - dtype: complex64
+            Complex input field.
+
+        k: float
+            Wave number : 2πn/λ
+
+        z_values: array_like, list
+            Axial coordinates of the target planes.
+
+        batch_size: int
+            Number of planes propagated by each inverse FFT call. Default is all planes at once, or one plane per
+            call if as_generator is True.
+
+        as_generator: bool
+            If True, returns a generator yielding the propagated planes one by one in the order of z_values.
+            Default is False.
+
+        :return: Complex-valued fields stacked along a new first axis, or a generator of fields.
+        """
+        if len(input_.shape) != len(self.padding):
+            raise ValueError("Input shape is incompatible.")
+
+        z_values = list(z_values)
+        if batch_size is None:
+            batch_size = 1 if as_generator else max(len(z_values), 1)
+
+        field = self.backend.pad(input_, self.padding, self.pad_fill_value)
+        spectrum = self.backend.fft(field, self.data_length, overwrite_input=True)
+        batches = self._propagate_spectrum(spectrum, k, z_values, batch_size)
+
+        if as_generator:
+            return (plane for batch in batches for plane in batch)
+        return self.backend.concat(list(batches), axis=0)
+
+    def sweep(self, input_, k, z0, dz, count, refresh_every=64):
+        """
+        Propagates the complex input field to the uniformly spaced planes z0, z0 + dz, ..., z0 + (count - 1) dz. The
+        input is padded and Fourier transformed only once, and each next transfer function is built from the previous
+        one by the recurrence P(z + dz) = P(z)·P(dz), i.e. a single complex multiplication instead of a sqrt and an exp.
+
+        The recurrence also holds for the evanescent decay exp(-|z|·√(k_t^2 - k^2)) as long as |z| grows without
+        changing its sign. Steps toward or across z = 0 are evaluated exactly, as well as every refresh_every-th plane
+        to bound the accumulated rounding error.
+
+        Parameters
+        ----------
+        input_: ndarray, tensor - dtype: complex64
+            Complex input field.
+
+        k: float
+            Wave number : 2πn/λ
+
+        z0: float
+            Axial coordinate of the first plane.
+
+        dz: float
+            Axial spacing of the planes.
+
+        count: int
+            Number of planes.
+
+        refresh_every: int
+            Number of planes after which the transfer function is evaluated exactly again. Default is 64.
+
+        :return: A generator yielding the propagated complex fields in order.
+        """
+        if len(input_.shape) != len(self.padding):
+            raise ValueError("Input shape is incompatible.")
+
+        field = self.backend.pad(input_, self.padding, self.pad_fill_value)
+        spectrum = self.backend.fft(field, self.data_length, overwrite_input=True)
+        return self._sweep_spectrum(spectrum, float(k), float(z0), float(dz), count, refresh_every)
+
+    def _sweep_spectrum(self, spectrum, k, z0, dz, count, refresh_every):
+        step = self._transfer_function(k, dz)
+        tf, z_prev = None, None
+        for i in range(count):
+            z = z0 + i * dz
+            if tf is None or i % refresh_every == 0 or z_prev * z < 0 or abs(z) < abs(z_prev):
+                tf = self._transfer_function(k, z)
+            else:
+                tf = tf * step
+            z_prev = z
+            yield self.backend.unpad(self.backend.ifft(tf * spectrum, self.data_length, overwrite_input=True), self.padding)
+
+    def _propagate_spectrum(self, spectrum, k, z_values, batch_size):
+        padding = [[0, 0]] + self.padding
+        for i in range(0, len(z_values), batch_size):
+            tfs = self.backend.stack([self.transfer_function(k, z) for z in z_values[i:i + batch_size]], axis=0)
+            yield self.backend.unpad(self.backend.ifft(tfs * spectrum, self.data_length, overwrite_input=True), padding)
@@ -0,0 +1,204 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+from itertools import product
+from . import base
+from .AngularSpectrum import AngularSpectrumSolver, diffraction_margin, resolve_backend
+from .cache import TransferFunctionCache
+from ..backend.Numpy import Numpy
+import threading
+import numpy
+import os
+
+# TensorFlow FFT kernels index tensors with 32-bit integers.
+_MAX_TILE_ELEMENTS = 2 ** 31 - 1
+
+
+class TiledSolver(base.Solver):
+    def __init__(self, shape, dr: Union[float, tuple, list], tile_shape=None, max_memory=None, workers=None,
+                 pad_fill_value=0, margin_scale=2.0, backend='numpy'):
+        """
+        Overlap-save angular spectrum propagation for fields which are too large to be padded and solved at once. The
+        field is split into tiles, each tile is propagated together with a margin of its neighbours sized by the
+        diffraction spread at z (see AngularSpectrum.diffraction_margin), and the valid tile centers are stitched.
+
+        Tolerance: the error comes from the ringing of the propagation kernel beyond the diffraction margin, which
+        decays slowly because of the sharp band limit, so it is not bounded by the margin alone. Measured against a
+        full-frame AngularSpectrumSolver solve padded by 4 margins + 64 pixels, on 512x512 smooth phase objects (unit
+        amplitude, Gaussian low-passed random phase of ±π), 128x128 tiles, λ=0.532 and (dr, z) of (2, 40), (1, 100)
+        and (1.12, 300), the relative RMS error of the stitched field is 1e-3 to 4e-3 for the default margin_scale=2,
+        7e-3 to 1.1e-2 for margin_scale=1 and 3e-4 to 1.2e-3 for margin_scale=4. Uniform random phase fields, which
+        fill the whole sampled band, are the worst case with 1.4e-2 to 2e-2 for margin_scale=2.
+
+        Parameters
+        ----------
+        shape : array_like, list, tuple
+            Shape of the full 1D or 2D input field.
+
+        dr : float, list[float], tuple[float]
+            Pixel size in every dimension.
+
+        tile_shape : array_like, list, tuple (Optional)
+            Shape of the valid center of each tile. Default is the whole field, shrunk to fit max_memory.
+
+        max_memory : int (Optional)
+            Upper bound in bytes for the working memory of all concurrently propagated tiles, including the transfer
+            function and the frequency grids of the tile solver (the input and output fields are not included). Tiles
+            are halved along their longest axis until they fit. Default is None.
+
+        workers : int (Optional)
+            Number of tiles propagated in parallel. Default is os.cpu_count().
+
+        pad_fill_value : float
+            Constant value assumed outside the field. Default is 0.
+
+        margin_scale : float
+            Multiplier of the diffraction margin. Default is 2.
+
+        backend : string, class(backend.core.CoreFunctions)
+            Computation backend of the tile solvers. Default is "numpy".
+        """
+        if len(shape) > 2:
+            raise ValueError("Only 1D and 2D fields without a batch dimension are supported.")
+
+        self.shape = tuple(shape)
+        self.dr = [dr] * len(shape) if (type(dr) is float or type(dr) is int) else list(dr)
+        self.tile_shape = tuple(tile_shape) if tile_shape is not None else self.shape
+        self.max_memory = max_memory
+        self.workers = workers or os.cpu_count() or 1
+        self.pad_fill_value = pad_fill_value
+        self.margin_scale = margin_scale
+        self.backend = resolve_backend(backend)
+
+        # Under a memory budget only the transfer function in use is kept.
+        self.cache = TransferFunctionCache(max_entries=8 if max_memory is None else 1)
+        self._solver_key, self._solver_ = None, None
+
+    def tiling(self, k, z, itemsize=8):
+        """
+        Chooses the tiling for a propagation.
+
+        Parameters
+        ----------
+        k:  float
+            Wave number : 2πn/λ
+
+        z:  float
+            Axial coordinate of the target plane.
+
+        itemsize: int
+            Bytes per element of the complex field. Default is 8 (complex64).
+
+        :return: Margins, valid tile shape and extended (margin included) tile shape, each as a tuple per axis.
+        """
+        margins = []
+        for d in self.dr:
+            m = diffraction_margin(k, z, d)
+            if m is None:
+                raise ValueError("The pixel size is not larger than half of the wavelength, so the diffraction spread "
+                                 "and the tile margin are unbounded.")
+            margins.append(int(numpy.ceil(m * self.margin_scale)))
+
+        core = [min(t, s) for t, s in zip(self.tile_shape, self.shape)]
+        while True:
+            extended = [self.backend.next_fast_len(c + 2 * m) for c, m in zip(core, margins)]
+            elements = int(numpy.prod(extended))
+            need = self._working_memory(elements, itemsize)
+            if elements <= _MAX_TILE_ELEMENTS and (self.max_memory is None or need <= self.max_memory):
+                break
+            i = int(numpy.argmax(core))
+            if core[i] == 1:
+                raise ValueError("The memory budget is too small for the diffraction margins of this propagation.")
+            core[i] = (core[i] + 1) // 2
+
+        # The rounding to a fast FFT length is spent on a larger valid center rather than on the margin.
+        core = [min(e - 2 * m, s) for e, m, s in zip(extended, margins, self.shape)]
+        return tuple(margins), tuple(core), tuple(extended)
+
+    def _working_memory(self, elements, itemsize):
+        # Bytes alive at the peak of a solve, counted in arrays of the extended tile shape. Shared by all workers: the
+        # transfer function, the solver's frequency grids (three float32 arrays for 2D, two for 1D) and the buffers of
+        # FFTW plans. Per worker, the Numpy based backends hold a tile and a spectrum buffer plus the temporaries of
+        # their transforms; other backends go through "solve" with its padded copy, spectrum, product, inverse
+        # transform and the conversion of the result. Computing the transfer function needs about six arrays, before
+        # the workers start.
+        grids = (len(self.shape) + 1) * 4 / itemsize
+        if issubclass(self.backend, Numpy):
+            per_worker = 2 + self.backend.transform_temporaries / itemsize
+        else:
+            per_worker = 6
+        shared = 1 + grids + getattr(self.backend, 'plan_arrays', 0)
+        return int(itemsize * elements * (shared + max(per_worker * self.workers, 6)))
+
+    def _solver(self, extended):
+        # Only the solver of the last tile shape is kept, with its frequency grids.
+        if self._solver_key != extended:
+            # The previous solver is released first, so that two sets of grids are never alive together.
+            self._solver_ = None
+            self._solver_ = AngularSpectrumSolver(shape=extended, dr=self.dr, is_batched=False, padding=None,
+                                                  backend=self.backend, cache=self.cache)
+            self._solver_key = extended
+        return self._solver_
+
+    def solve(self, input_, k, z, out=None):
+        """
+        Propagates the complex input field tile by tile.
+
+        Parameters
+        ----------
+        input_: ndarray - dtype: complex64
+            Complex input field with the shape given on initialization.
+
+        k: float
+            Wave number : 2πn/λ
+
+        z: float
+            Axial coordinate of the target plane.
+
+        out: ndarray (Optional)
+            An array with the shape of the input to write the result into.
+
+        :return: Complex-valued propagated field as an ndarray.
+        """
+        input_ = numpy.asarray(input_)
+        if input_.shape != self.shape:
+            raise ValueError("Input shape is incompatible.")
+
+        dtype = numpy.result_type(input_.dtype, numpy.complex64)
+        margins, core, extended = self.tiling(k, z, itemsize=dtype.itemsize)
+        solver = self._solver(extended)
+        tf = solver.transfer_function(k, z)
+        direct = issubclass(self.backend, Numpy)
+
+        if out is None:
+            out = numpy.empty(self.shape, dtype=dtype)
+
+        # Every worker thread reuses its own tile (and spectrum) buffer for all of its tiles.
+        local = threading.local()
+
+        def propagate(start):
+            if not hasattr(local, 'buffers'):
+                local.buffers = [numpy.empty(extended, dtype=dtype) for _ in range(2 if direct else 1)]
+            tile = local.buffers[0]
+            tile.fill(self.pad_fill_value)
+            src, dst = [], []
+            for s, m, e, n in zip(start, margins, extended, self.shape):
+                lo, hi = max(s - m, 0), min(s - m + e, n)
+                src.append(slice(lo, hi))
+                dst.append(slice(lo - (s - m), hi - (s - m)))
+            tile[tuple(dst)] = input_[tuple(src)]
+
+            if direct:
+                # The tile solver has no padding, so "solve" reduces to the transforms, run in the two buffers.
+                spectrum = self.backend.fft(tile, solver.data_length, overwrite_input=True, out=local.buffers[1])
+                numpy.multiply(spectrum, tf, out=spectrum)
+                res = self.backend.ifft(spectrum, solver.data_length, overwrite_input=True, out=tile)
+            else:
+                res = numpy.asarray(solver.solve(tile, k, z))
+            valid = [min(c, n - s) for c, s, n in zip(core, start, self.shape)]
+            out[tuple(slice(s, s + v) for s, v in zip(start, valid))] = \
+                res[tuple(slice(m, m + v) for m, v in zip(margins, valid))]
+
+        starts = list(product(*[range(0, n, c) for n, c in zip(self.shape, core)]))
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(starts))) as executor:
+            list(executor.map(propagate, starts))
+        return out
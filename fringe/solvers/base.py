@@ -5,3 +5,15 @@ class Solver:
     @abstractmethod
     def solve(self, input_, *args, **kwargs):
         raise NotImplementedError
+
+
+def sweep(solver, input_, k, z0, dz, count):
+    """
+    Propagates the input field to the planes z0, z0 + dz, ..., z0 + (count - 1) dz with solver.sweep, or plane by
+    plane with solver.solve for solvers without it (e.g. TiledSolver).
+
+    :return: A generator yielding the propagated complex fields in order.
+    """
+    if hasattr(solver, 'sweep'):
+        return solver.sweep(input_, k, z0, dz, count)
+    return (solver.solve(input_, k, z0 + i * dz) for i in range(count))
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+import threading
+import numbers
+import numpy
+
+# Default bound of the cached bytes: a padded 2048x2048 complex64 transfer function takes 128 MiB.
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+
+def _nbytes(tensor):
+    nbytes = getattr(tensor, 'nbytes', None)
+    if nbytes is not None:
+        return int(nbytes)
+    # TensorFlow tensors do not expose nbytes.
+    return int(numpy.prod(tensor.shape)) * tensor.dtype.size
+
+
+def is_cacheable(*values):
+    """
+    Only plain python/numpy scalars are used as cache keys. Tensors (e.g. tf.Variable being watched by a
+    GradientTape) bypass the cache so that gradients with respect to k or z are preserved.
+    """
+    return all(isinstance(v, numbers.Real) for v in values)
+
+
+class TransferFunctionCache:
+    def __init__(self, max_entries=8, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Least-recently-used cache for transfer function tensors. Entries are keyed by the grid geometry and backend
+        of the owner solver and the scalar (k, z) pair, so a cache could be shared between solvers of different shapes.
+
+        Parameters
+        ----------
+        max_entries : int
+            Maximum number of stored transfer functions. 0 disables caching. Default is 8.
+
+        max_bytes : int, None
+            Maximum total size of stored transfer functions in bytes. None means unbounded. Default is 256 MiB.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, compute):
+        """
+        Returns the tensor stored for the key, or calls compute() and stores its result.
+
+        Parameters
+        ----------
+        key : tuple
+            A hashable key.
+
+        compute : callable
+            A function with no arguments which returns the tensor to store.
+        """
+        return self.get_many([key], lambda keys: [compute()])[0]
+
+    def get_many(self, keys, compute):
+        """
+        Returns the tensors stored for the keys. The missing ones are computed together by a single compute() call and
+        stored.
+
+        Parameters
+        ----------
+        keys : list[tuple]
+            Hashable keys.
+
+        compute : callable
+            A function which takes the list of missing keys and returns their tensors in the same order.
+        """
+        values, missing = {}, []
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    values[key] = self._entries[key]
+                elif key not in missing:
+                    self.misses += 1
+                    missing.append(key)
+
+        if missing:
+            computed = compute(missing)
+            for key, value in zip(missing, computed):
+                values[key] = value
+                self._put(key, value)
+        return [values[key] for key in keys]
+
+    def _put(self, key, value):
+        size = _nbytes(value)
+        if self.max_entries <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = value
+                self.nbytes += size
+            while len(self._entries) > self.max_entries or \
+                    (self.max_bytes is not None and self.nbytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= _nbytes(evicted)
+
+    def clear(self):
+        """
+        Removes all entries and resets the hit/miss counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        :return: A dict of cache statistics: hits, misses, entries and bytes.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'bytes': self.nbytes}
@@ -1,5 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+import json
+import os
 import numpy as np
-from skimage import io
 
 
 def import_image(path, modifiers=None, verbose=False, *args, **kwargs):
@@ -20,6 +24,8 @@ def import_image(path, modifiers=None, verbose=False, *args, **kwargs):
     ----------
         The imported image with a type of ndarray.
     """
+    # skimage.io is imported here so that importing the solvers and modules does not load it.
+    from skimage import io
     img = io.imread(path)
 
     if verbose:
@@ -36,7 +42,7 @@ def import_image(path, modifiers=None, verbose=False, *args, **kwargs):
     return img
 
 
-def import_image_seq(paths, modifiers=None, verbose=False, *args, **kwargs):
+def import_image_seq(paths, modifiers=None, verbose=False, *args, workers=1, stack=False, **kwargs):
     """
     Imports a sequence of images for a given list of paths.
 
@@ -50,15 +56,73 @@ def import_image_seq(paths, modifiers=None, verbose=False, *args, **kwargs):
             iterable[class(modifiers.Modifier)]
             list of 'Modifier' classes to apply operations on images on import.
 
+        workers:
+            int
+            number of threads which decode and process images in parallel. The order of paths is kept. Default: 1
+
+        stack:
+            bool
+            if True, images are copied into one preallocated array of shape (count, ...) as they arrive, instead of
+            being collected in a list. All images must have the same shape and dtype after the modifiers. Default: False
+
+    Returns:
+    ----------
+        A list of imported images with the order of paths of type ndarray, or a single ndarray if stack is True.
+    """
+    paths = list(paths)
+    images = iter_image_seq(paths, modifiers, verbose, *args, workers=workers, **kwargs)
+    if not stack:
+        return list(images)
+
+    out = None
+    for i, img in enumerate(images):
+        if out is None:
+            out = np.empty((len(paths),) + np.shape(img), dtype=img.dtype)
+        out[i] = img
+    return out if out is not None else np.empty((0,))
+
+
+def iter_image_seq(paths, modifiers=None, verbose=False, *args, workers=2, prefetch=None, **kwargs):
+    """
+    Iterates over a sequence of images which are decoded and processed ahead in background threads, so that the next
+    images are ready while the current one is used, e.g. by a solver.
+
+    Parameters:
+    -----------
+        paths:
+            iterable, list, tuple
+            Paths of the images each given as a string.
+
+        modifiers:
+            iterable[class(modifiers.Modifier)]
+            list of 'Modifier' classes to apply operations on images on import.
+
+        workers:
+            int
+            number of threads. With 1, images are imported in the calling thread on demand. Default: 2
+
+        prefetch:
+            int
+            maximum number of images imported ahead of the consumer. Default: 2 * workers
+
     Returns:
     ----------
-        A list of imported images with the order of paths of type ndarray.
+        A generator yielding the imported images in the order of paths.
     """
-    imgs = []
-    for path in paths:
-        img = import_image(path, modifiers, verbose, *args, **kwargs)
-        imgs.append(img)
-    return imgs
+    if workers <= 1:
+        for path in paths:
+            yield import_image(path, modifiers, verbose, *args, **kwargs)
+        return
+
+    prefetch = prefetch or 2 * workers
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append(executor.submit(import_image, path, modifiers, verbose, *args, **kwargs))
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
 
 def export_image(image, path, dtype='uint8', verbose=True):
@@ -84,17 +148,260 @@ def export_image(image, path, dtype='uint8', verbose=True):
         will be replaced with 1 and 0.
     """
     assert dtype in ['uint8', 'uint16']
-    _img = image.copy()
-    _img[_img > 1] = 1
-    _img[_img < 0] = 0
-
-    if dtype == 'uint8':
-        _img *= 2 ** 8 - 1
-        _img = np.uint8(_img)
-    elif dtype == 'uint16':
-        _img *= 2 ** 16 - 1
-        _img = np.uint16(_img)
+    _img = quantize(image, dtype)
 
+    from skimage import io
     io.imsave(path, _img, check_contrast=False)
     if verbose:
         print("Image exported to:", path)
+
+
+def save_stack(path, stack, dr=None, wavelength=None, z_values=None, **metadata):
+    """
+    Saves a processed stack of images or fields, e.g. a (count, H, W) float32 or complex64 array, to a .npy file with
+    its metadata in a .json file next to it. See load_stack.
+
+    Parameters:
+    -----------
+        path:
+            string, path
+            output path, with or without the .npy extension.
+        stack:
+            ndarray
+            the stack array.
+        dr, wavelength, z_values:
+            float, list (Optional)
+            pixel size, wavelength and axial distances of the frames.
+        metadata:
+            any other JSON serializable values to store.
+    """
+    npy_path, json_path = _stack_paths(path)
+    np.save(npy_path, np.asarray(stack))
+    _save_metadata(json_path, dr=dr, wavelength=wavelength, z_values=z_values, **metadata)
+
+
+def load_stack(path, mmap_mode='r'):
+    """
+    Opens a stack saved by save_stack or StackWriter. By default the file is memory-mapped without copying it, and
+    each frame is read from disk when it is accessed.
+
+    Parameters:
+    -----------
+        path:
+            string, path
+            path of the stack, with or without the .npy extension.
+        mmap_mode:
+            string
+            memory-map mode of np.load: 'r', 'r+', 'c', or None to read the whole stack into memory. Default: 'r'
+
+    Returns:
+    ----------
+        The stack array and the dict of its metadata (empty if the .json file does not exist).
+    """
+    npy_path, json_path = _stack_paths(path)
+    stack = np.load(npy_path, mmap_mode=mmap_mode)
+    metadata = {}
+    if os.path.isfile(json_path):
+        with open(json_path) as f:
+            metadata = json.load(f)
+    return stack, metadata
+
+
+class StackWriter:
+    def __init__(self, path, count, frame_shape, dtype='float32', dr=None, wavelength=None, z_values=None,
+                 **metadata):
+        """
+        Writes a stack frame by frame into a .npy file (see load_stack), e.g. while the frames are computed. Frames are
+        appended to the file, so the memory use does not grow with the count.
+
+        Parameters:
+        -----------
+            path:
+                string, path
+                output path, with or without the .npy extension.
+            count:
+                int
+                number of frames.
+            frame_shape:
+                tuple
+                shape of each frame.
+            dtype:
+                string, dtype
+                data type of the stored frames. Default: 'float32'
+            dr, wavelength, z_values, metadata:
+                see save_stack.
+
+        Example:
+        -----------
+        >>> with StackWriter('holograms.npy', len(paths), (512, 512), dr=1.12, z_values=zs) as writer:
+        ...     for img in iter_image_seq(paths, modifiers):
+        ...         writer.append(img)
+        """
+        self.count = count
+        self.dtype = np.dtype(dtype)
+        self.written = 0
+        npy_path, json_path = _stack_paths(path)
+        _save_metadata(json_path, dr=dr, wavelength=wavelength, z_values=z_values, **metadata)
+        header = {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                  'shape': (count,) + tuple(frame_shape)}
+        self._file = open(npy_path, 'wb')
+        np.lib.format.write_array_header_1_0(self._file, header)
+
+    def append(self, frame):
+        """
+        Writes the next frame.
+        """
+        if self.written >= self.count:
+            raise ValueError("All {} frames of the stack are already written.".format(self.count))
+        np.ascontiguousarray(frame, dtype=self.dtype).tofile(self._file)
+        self.written += 1
+
+    def close(self):
+        """
+        Closes the file. Raises ValueError if fewer frames than count were written.
+        """
+        if not self._file.closed:
+            self._file.close()
+            if self.written != self.count:
+                raise ValueError("Only {} of {} frames were written.".format(self.written, self.count))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+def _stack_paths(path):
+    path = str(path)
+    base = path[:-4] if path.endswith('.npy') else path
+    return base + '.npy', base + '.json'
+
+
+def _save_metadata(path, **metadata):
+    # numpy values are converted to plain python types for JSON.
+    metadata = {key: np.asarray(value).tolist() for key, value in metadata.items() if value is not None}
+    with open(path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+
+def quantize(image, dtype='uint8', out=None):
+    """
+    Scales an image with values between 0 and 1 to the full range of an unsigned integer type. Values higher than 1 and
+    lower than 0 are clipped. The image is not modified and no copy of it is made: scaling goes to a single float
+    temporary, and clipping writes straight into the integer output.
+
+    Parameters:
+    -----------
+        image:
+            ndarray
+            the image array.
+        dtype:
+            string, dtype
+            unsigned integer type of the output. Default: 'uint8'
+        out:
+            ndarray
+            optional output array with the shape of the image and the given dtype.
+
+    Returns:
+    ----------
+        The quantized image.
+    """
+    scale = np.iinfo(dtype).max
+    scaled = np.multiply(image, scale, dtype=np.result_type(image.dtype, np.float32))
+    if out is None:
+        out = np.empty(image.shape, dtype=dtype)
+    return np.clip(scaled, 0, scale, out=out, casting='unsafe')
+
+
+class AsyncExporter:
+    def __init__(self, workers=2, max_pending=8, verbose=False):
+        """
+        Exports images in background threads, so that disk writes and image compression overlap with the computation
+        which produces the images. Use it as a context manager, or call close() when done.
+
+        Parameters:
+        -----------
+            workers:
+                int
+                number of writer threads. Default: 2
+            max_pending:
+                int
+                maximum number of images queued or being written. "export" blocks while the queue is full, which
+                bounds the memory held by pending images. Default: 8
+            verbose:
+                bool
+                print the path of every exported image. Default: False
+
+        Example:
+        -----------
+        >>> with AsyncExporter(workers=4) as exporter:
+        ...     for i, h in enumerate(holograms):
+        ...         exporter.export(h, str(i) + '.png')
+        """
+        self.verbose = verbose
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = set()
+        self._errors = []
+        self._lock = threading.Lock()
+
+    def export(self, image, path, dtype='uint8'):
+        """
+        Queues an image for export. The image is clipped and quantized in the calling thread (see export_image), so
+        the caller may reuse or modify its array right after the call.
+        """
+        assert dtype in ['uint8', 'uint16']
+        data = quantize(image, dtype)
+        self._slots.acquire()
+        future = self._executor.submit(self._write, data, path)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    def _write(self, data, path):
+        from skimage import io
+        io.imsave(path, data, check_contrast=False)
+        if self.verbose:
+            print("Image exported to:", path)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+            if future.exception() is not None:
+                self._errors.append(future.exception())
+        self._slots.release()
+
+    def flush(self):
+        """
+        Waits until all queued images are written. Raises the first error of a failed write since the last flush.
+        """
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                break
+            for future in pending:
+                future.exception()
+        with self._lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        """
+        Writes all queued images and stops the writer threads.
+        """
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
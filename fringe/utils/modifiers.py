@@ -1,6 +1,6 @@
 import numpy as np
+import threading
 from skimage import color
-import tensorflow as tf
 from abc import abstractmethod
 
 # Modifiers are classes having a 'solvers()' function. These functions could be passed as a parameter
@@ -143,6 +143,8 @@ class ConvertToTensor(Modifier):
         pass
 
     def process(self, img, *args, **kwargs):
+        # tensorflow is imported here so that importing the modifiers does not load it.
+        import tensorflow as tf
         return tf.convert_to_tensor(img)
 
 
@@ -156,3 +158,155 @@ class Map(Modifier):
 
     def process(self, img, *args, **kwargs):
         return self.function(img, *args, **kwargs)
+
+
+class Pipeline(Modifier):
+    def __init__(self, modifiers):
+        """
+        Runs a list of modifiers as one fused preprocessing step. ImageToArray, Normalize and MakeComplex are replaced
+        by equivalent operations with fewer passes: the crop is taken first, the bit depth scale is folded into the
+        cast (and into the rgb2gray weights), Normalize works in place, and an identity phase of MakeComplex is
+        skipped. Intermediate arrays are kept and reused between calls of the same thread, so a pipeline could be
+        shared by threads, e.g. the workers of utils.io.import_image_seq. Other modifiers run their own "process".
+        Results equal those of the modifiers applied one by one, up to floating point rounding.
+
+        :param modifiers: iterable[class(Modifier)] list of modifiers in the order of application.
+        """
+        self.modifiers = list(modifiers)
+        self._local = threading.local()
+        self._phasors = {}
+
+    @property
+    def _buffers(self):
+        # Intermediate buffers of the calling thread.
+        if not hasattr(self._local, 'buffers'):
+            self._local.buffers = {}
+        return self._local.buffers
+
+    def process(self, img, *args, out=None, **kwargs):
+        """
+        Processes a single image.
+
+        :param img: The input image.
+        :param out: Optional output array for the result of the last modifier.
+        :return: The processed image.
+        """
+        return self._run(np.asarray(img), 0, out, args, kwargs)
+
+    def process_stack(self, stack, *args, out=None, **kwargs):
+        """
+        Processes a stack of images at once, e.g. (N, H, W) gray or (N, H, W, C) color images. Normalize uses the
+        minimum of each image.
+
+        :param stack: The input images stacked along the first axis.
+        :param out: Optional output array for the result of the last modifier.
+        :return: The processed images stacked along the first axis.
+        """
+        return self._run(np.asarray(stack), 1, out, args, kwargs)
+
+    def _run(self, x, batch_dims, out, args, kwargs):
+        last = len(self.modifiers) - 1
+        for i, m in enumerate(self.modifiers):
+            target = out if i == last else None
+            if type(m) is ImageToArray:
+                x = self._image_to_array(m, i, x, batch_dims, i == last, target)
+            elif type(m) is Normalize:
+                x = self._normalize(m, i, x, batch_dims, i == last, target)
+            elif type(m) is MakeComplex:
+                x = self._make_complex(m, i, x, i == last, target)
+            else:
+                if batch_dims:
+                    results = [m.process(img=f, *args, **kwargs) for f in x]
+                    x = np.stack(results) if all(isinstance(r, np.ndarray) for r in results) else results
+                else:
+                    x = m.process(img=x, *args, **kwargs)
+                if target is not None:
+                    target[...] = x
+                    x = target
+        return self._detach(x)
+
+    def _detach(self, x):
+        # A result which is a view of a buffer (e.g. cropped by a Map) would be overwritten by the next call.
+        if isinstance(x, list):
+            return [self._detach(r) for r in x]
+        if isinstance(x, np.ndarray) and any(np.may_share_memory(x, b) for b in self._buffers.values()):
+            return x.copy()
+        return x
+
+    def _buffer(self, key, shape, dtype, final=False, out=None):
+        # The result of the last modifier is a new array (or 'out'), other results live in reused buffers.
+        if final:
+            return out if out is not None else np.empty(shape, dtype=dtype)
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != np.dtype(dtype):
+            buffer = self._buffers[key] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def _owns(self, x):
+        return any(x is b for b in self._buffers.values())
+
+    def _image_to_array(self, m, i, x, batch_dims, final, out):
+        frame_ndim = x.ndim - batch_dims
+        if frame_ndim == 2 and m.chan in ['r', 'g', 'b', 'rgb']:
+            raise AssertionError('The image is grayscale but your expecting an RGB image.')
+        if frame_ndim not in (2, 3):
+            raise ValueError('Input array is not an image or its type is not supported.')
+
+        if m.crop is not None:
+            cx, cy, w, h = m.crop
+            x = x[..., cy:cy + h, cx:cx + w] if frame_ndim == 2 else x[..., cy:cy + h, cx:cx + w, :]
+
+        scale = 1 / (2 ** m.bd - 1)
+        if m.chan == 'gray' and frame_ndim == 3:
+            # Weights of skimage.color.rgb2gray, scaled by the bit depth.
+            weights = [0.2125 * scale, 0.7154 * scale, 0.0721 * scale]
+            target = self._buffer(i, x.shape[:-1], m.dtype, final, out)
+            term = self._buffer((i, 'term'), x.shape[:-1], m.dtype)
+            np.multiply(x[..., 0], weights[0], out=target, casting='unsafe')
+            for c in (1, 2):
+                np.multiply(x[..., c], weights[c], out=term, casting='unsafe')
+                target += term
+            return target
+
+        if m.chan in ['r', 'g', 'b']:
+            x = x[..., 'rgb'.index(m.chan)]
+        target = self._buffer(i, x.shape, m.dtype, final, out)
+        np.multiply(x, scale, out=target, casting='unsafe')
+        return target
+
+    def _normalize(self, m, i, x, batch_dims, final, out):
+        dtype = x.dtype if np.issubdtype(x.dtype, np.floating) else np.dtype('float32')
+        # The result of the previous fused step is modified in place.
+        target = x if not final and self._owns(x) else self._buffer(i, x.shape, dtype, final, out)
+        if m.bg is not None:
+            np.divide(x, m.bg, out=target, casting='unsafe')
+        elif target is not x:
+            np.copyto(target, x, casting='unsafe')
+        minh = np.min(target, axis=tuple(range(batch_dims, target.ndim)), keepdims=True)
+        target -= minh
+        target /= 1 - minh
+        return target
+
+    def _make_complex(self, m, i, x, final, out):
+        target = self._buffer(i, x.shape, m.dtype, final, out)
+        if m.target == 'amplitude':
+            if np.ndim(m._ph) == 0 and m._ph == 0:
+                np.copyto(target, x, casting='unsafe')
+            else:
+                if i not in self._phasors:
+                    self._phasors[i] = np.exp(1j * np.asarray(m._ph)).astype(m.dtype)
+                np.multiply(x, self._phasors[i], out=target)
+        elif m.target == 'phase':
+            angle = self._buffer((i, 'angle'), x.shape, target.real.dtype)
+            np.multiply(x, m._ph_coef, out=angle, casting='unsafe')
+            np.cos(angle, out=target.real)
+            np.sin(angle, out=target.imag)
+            if not (np.ndim(m._amp) == 0 and m._amp == 1):
+                target *= m._amp
+        elif m.target == 'real':
+            target.real[...] = x
+            target.imag[...] = m._imag
+        elif m.target == 'imaginary':
+            target.real[...] = m._real
+            target.imag[...] = x
+        return target
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from fringe.solvers.AngularSpectrum import AngularSpectrumSolver
+from fringe.solvers.cache import TransferFunctionCache
+
+K = 2 * np.pi / 0.532
+
+
+def test_lru_order_and_counters():
+    cache = TransferFunctionCache(max_entries=2, max_bytes=None)
+    calls = []
+
+    def get(key):
+        return cache.get(key, lambda: calls.append(key) or np.full(4, len(calls), dtype=np.complex64))
+
+    a = get('a')
+    get('b')
+    assert get('a') is a
+    get('c')  # Evicts 'b', the least recently used entry.
+    assert get('a') is a
+    get('b')
+    assert calls == ['a', 'b', 'c', 'b']
+    assert cache.info() == {'hits': 2, 'misses': 4, 'entries': 2, 'bytes': 2 * 32}
+
+    cache.clear()
+    assert cache.info() == {'hits': 0, 'misses': 0, 'entries': 0, 'bytes': 0}
+
+
+def test_byte_bound():
+    cache = TransferFunctionCache(max_entries=8, max_bytes=2 * 8 * 100)
+    for key in range(3):
+        cache.get(key, lambda: np.zeros(100, dtype=np.complex64))
+    assert len(cache) == 2 and cache.nbytes == 1600
+    # The oldest entry went first.
+    cache.get(1, lambda: pytest.fail("Entry 1 must be cached."))
+    cache.get(0, lambda: np.zeros(100, dtype=np.complex64))
+    assert cache.misses == 4 and cache.hits == 1
+
+    # An entry larger than the bound is returned but not stored, and does not evict the others.
+    large = cache.get('large', lambda: np.zeros(1000, dtype=np.complex64))
+    assert large.shape == (1000,) and 'large' not in cache._entries and len(cache) == 2
+
+
+def test_disabled_cache():
+    cache = TransferFunctionCache(max_entries=0)
+    cache.get('a', lambda: np.zeros(4))
+    cache.get('a', lambda: np.zeros(4))
+    assert cache.info() == {'hits': 0, 'misses': 2, 'entries': 0, 'bytes': 0}
+
+
+def test_shared_cache_is_keyed_by_geometry_and_backend():
+    pytest.importorskip('scipy')
+    cache = TransferFunctionCache()
+    z = -120.
+    configs = [((32, 32), 1.12, 'same', 'numpy'),
+               ((32, 48), 1.12, 'same', 'numpy'),
+               ((32, 32), 1.12, [[0, 8], [4, 4]], 'numpy'),
+               ((32, 32), 1.12, 'same', 'scipy'),
+               ((32, 32), 2.0, 'same', 'numpy'),
+               ((32, 32), [1.12, 2.0], 'same', 'numpy')]
+    solvers = [AngularSpectrumSolver(shape, dr, False, padding, backend=backend, cache=cache)
+               for shape, dr, padding, backend in configs]
+
+    results = [solver.transfer_function(K, z) for solver in solvers]
+    assert cache.misses == len(configs) and cache.hits == 0 and len(cache) == len(configs)
+    for config, solver, result in zip(configs, solvers, results):
+        shape, dr, padding, backend = config
+        expected = AngularSpectrumSolver(shape, dr, False, padding, backend=backend, cache=None).transfer_function(K, z)
+        np.testing.assert_array_equal(result, expected)
+        assert solver.transfer_function(K, z) is result
+    assert cache.hits == len(configs)
+
+
+@pytest.mark.parametrize('k, z', [([K, K, 0.9 * K, K], -100.),
+                                  (K, [-100., -150., -100., -150.]),
+                                  ([K, 0.9 * K, K, 0.9 * K], [-100., -150., -100., -150.])])
+def test_vector_transfer_functions_are_deduplicated(k, z):
+    shape = (4, 32, 32)
+    solver = AngularSpectrumSolver(shape, 1.12, True, 'same', backend='numpy')
+    pairs = list(zip(*np.broadcast_arrays(np.asarray(k, dtype=np.float64), np.asarray(z, dtype=np.float64))))
+    unique = len(set(pairs))
+
+    tf = solver.transfer_function(k, z)
+    assert tf.shape[0] == len(pairs)
+    assert solver.cache.misses == unique and len(solver.cache) == unique
+    for i, (kk, zz) in enumerate(pairs):
+        # The entries are the ones of the scalar path, which is served from the cache now.
+        np.testing.assert_array_equal(tf[i:i + 1], solver.transfer_function(float(kk), float(zz)))
+    assert solver.cache.misses == unique and solver.cache.hits == len(pairs)
+
+    solver.transfer_function(k, z)
+    assert solver.cache.misses == unique and solver.cache.hits == len(pairs) + unique
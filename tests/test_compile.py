@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+from fringe.solvers.AngularSpectrum import AngularSpectrumSolver  # noqa: E402
+
+
+@pytest.mark.parametrize('is_batched, shape', [(False, (48, 40)), (True, (3, 48, 40))])
+def test_compiled_solve_matches_eager_without_retracing(is_batched, shape):
+    rng = np.random.default_rng(0)
+    field = (rng.standard_normal(shape) + 1j * rng.standard_normal(shape)).astype(np.complex64)
+    solver = AngularSpectrumSolver(shape, 1.12, is_batched, 'same', backend='tensorflow', cache=None)
+    compiled = solver.compile()
+
+    # Python floats, numpy float64 and float32 values of k and z.
+    for k, z in [(2 * np.pi / 0.532, -100.), (np.float64(2 * np.pi / 0.633), np.float64(-150.)),
+                 (np.float32(2 * np.pi / 0.405), np.float32(-220.5)), (11.8, 75)]:
+        # The compiled function takes k and z as float32.
+        expected = solver.solve(field, np.float32(k), np.float32(z)).numpy()
+        result = compiled(field, k, z).numpy()
+        assert np.linalg.norm(result - expected) <= 1e-6 * np.linalg.norm(expected)
+    assert compiled.experimental_get_tracing_count() == 1
@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip('pyfftw')
+from fringe.backend.FFTW import FFTW  # noqa: E402
+
+
+@pytest.fixture
+def fftw(monkeypatch, tmp_path):
+    monkeypatch.setattr(FFTW, 'planner_effort', 'FFTW_ESTIMATE')
+    monkeypatch.setattr(FFTW, 'wisdom_path', str(tmp_path / 'wisdom.pkl'))
+    monkeypatch.setattr(FFTW, '_plans', type(FFTW._plans)())
+    return FFTW
+
+
+def test_transforms_match_numpy(fftw):
+    rng = np.random.default_rng(0)
+    x = (rng.standard_normal((3, 32, 48)) + 1j * rng.standard_normal((3, 32, 48))).astype(np.complex64)
+    expected = np.fft.fftn(x, axes=(-2, -1))
+
+    np.testing.assert_allclose(fftw.fft(x, 2), expected, rtol=1e-4, atol=1e-3)
+    out = np.empty_like(x)
+    assert fftw.fft(x, 2, out=out) is out
+    np.testing.assert_allclose(out, expected, rtol=1e-4, atol=1e-3)
+    # An unaligned view and a transform in place go through the plan buffers.
+    view = np.empty((3, 32, 49), dtype=np.complex64)[..., 1:]
+    assert fftw.fft(x, 2, out=view) is view
+    np.testing.assert_allclose(view, expected, rtol=1e-4, atol=1e-3)
+    y = x.copy()
+    fftw.ifft(fftw.fft(y, 2, out=y), 2, out=y)
+    np.testing.assert_allclose(y, x, atol=1e-5)
+    # The input of an earlier call is never used as a plan buffer.
+    a = x.copy()
+    fftw.fft(a, 2)
+    fftw.fft(x[..., ::-1], 2)
+    np.testing.assert_array_equal(a, x)
+
+
+def test_plans_are_bounded_and_wisdom_is_saved_once(fftw, monkeypatch):
+    monkeypatch.setattr(FFTW, 'max_plans', 3)
+    for n in range(8, 13):
+        fftw.fft(np.zeros((5, n), dtype=np.complex64), 1)
+    fftw.fft(np.zeros((5, 10), dtype=np.complex64), 1)
+    fftw.fft(np.zeros((5, 13), dtype=np.complex64), 1)
+    assert [key[0] for key in fftw._plans] == [(5, 12), (5, 10), (5, 13)]
+
+    assert not os.path.exists(fftw.wisdom_path)
+    assert fftw._wisdom_changed
+    fftw.save_wisdom()
+    assert os.path.isfile(fftw.wisdom_path) and not fftw._wisdom_changed
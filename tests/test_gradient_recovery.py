@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+from fringe.solvers.AngularSpectrum import AngularSpectrumSolver  # noqa: E402
+from fringe.modules.GradientRecovery import GradientPhaseOptimizer, propagate  # noqa: E402
+
+
+def _phase_object(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    fy, fx = np.fft.fftfreq(shape[0])[:, None], np.fft.fftfreq(shape[1])[None, :]
+    phase = np.real(np.fft.ifft2(np.fft.fft2(rng.standard_normal(shape)) * np.exp(-(fx * fx + fy * fy) / 0.002)))
+    return np.exp(1j * phase / np.abs(phase).max()).astype(np.complex64)
+
+
+@pytest.mark.parametrize('padding', ['same', None, [[3, 5], [0, 7]]])
+def test_custom_gradient_matches_autodiff(padding):
+    k, z, shape = 2 * np.pi / 0.532, -60., (32, 32)
+    solver = AngularSpectrumSolver(shape, 1.12, False, padding, backend='tensorflow')
+    rng = np.random.default_rng(1)
+    x = tf.Variable(tf.constant(_phase_object(shape)))
+    target = tf.constant(rng.uniform(0.5, 1.5, shape).astype(np.float32))
+
+    gradients = []
+    for forward in (propagate, lambda s, f, k_, z_: s.solve(f, k_, z_)):
+        with tf.GradientTape() as tape:
+            u = forward(solver, x, k, z)
+            loss = tf.reduce_sum((tf.abs(u) - target) ** 2)
+        gradients.append(tape.gradient(loss, x).numpy())
+
+    custom, autodiff = gradients
+    assert np.linalg.norm(custom - autodiff) <= 1e-4 * np.linalg.norm(autodiff)
+
+
+def test_adam_lowers_the_loss():
+    k, z_values, shape = 2 * np.pi / 0.532, [-100., -150., -200.], (32, 32)
+    solver = AngularSpectrumSolver(shape, 1.12, False, 'same', backend='tensorflow')
+    obj = _phase_object(shape)
+    images = [np.abs(solver.solve(obj, k, z).numpy()).astype(np.float32) for z in z_values]
+
+    optimizer = GradientPhaseOptimizer(solver, 'adam', learning_rate=0.05)
+    field, history = optimizer.optimize(images, k, z_values, iterations=40, return_history=True)
+    assert len(history) == 40
+    assert history[-1] < 0.5 * history[0]
+    assert np.isfinite(field.numpy()).all()
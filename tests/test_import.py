@@ -0,0 +1,45 @@
+"""Import-time regression tests: numpy users must not pay for importing tensorflow."""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# numpy is imported before the clock starts, it is a required dependency and not part of the budget.
+SCRIPT = """
+import json, sys, time
+import numpy
+start = time.perf_counter()
+import fringe
+import fringe.solvers.AngularSpectrum
+import fringe.solvers.Tiled
+import fringe.modules.PhaseRecovery
+import fringe.modules.Simulator
+import fringe.modules.Scanner
+import fringe.modules.Autofocus
+import fringe.utils.io
+import fringe.utils.modifiers
+elapsed = time.perf_counter() - start
+fringe.solvers.AngularSpectrum.AngularSpectrumSolver(shape=(16, 16), dr=1., is_batched=False, backend='numpy')
+print(json.dumps({'elapsed': elapsed, 'tensorflow': 'tensorflow' in sys.modules}))
+"""
+
+IMPORT_BUDGET = 0.1
+
+
+def _run():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    out = subprocess.run([sys.executable, '-c', SCRIPT], cwd=ROOT, env=env, check=True, stdout=subprocess.PIPE)
+    return json.loads(out.stdout.decode().strip().splitlines()[-1])
+
+
+def test_numpy_backend_does_not_import_tensorflow():
+    assert not _run()['tensorflow']
+
+
+def test_import_time():
+    # The best of a few runs, so that a busy machine does not fail the test.
+    elapsed = min(_run()['elapsed'] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET, "Importing fringe took {:.0f} ms".format(elapsed * 1e3)
@@ -0,0 +1,64 @@
+import numpy as np
+from fringe.utils.io import import_image_seq
+from fringe.utils.modifiers import ImageToArray, Normalize, MakeComplex, Map, Pipeline
+
+
+def _chain(modifiers, img):
+    for m in modifiers:
+        img = m.process(img=img)
+    return img
+
+
+def _images(count, shape, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 2 ** 16, shape, dtype=np.uint16) for _ in range(count)]
+
+
+def test_pipeline_matches_chain():
+    img = _images(1, (128, 128))[0]
+    rgb = np.random.default_rng(1).integers(0, 256, (64, 80, 3), dtype=np.uint8)
+    background = np.random.default_rng(2).uniform(0.5, 1, (48, 48)).astype('float32')
+    cases = [([ImageToArray(16, 'gray', [10, 20, 48, 48]), Normalize(background.copy()), MakeComplex()], img),
+             ([ImageToArray(8, 'gray', [5, 5, 48, 48]), Normalize(background.copy()),
+               MakeComplex(set_as='phase', phase_coef=2 * np.pi, amplitude=0.5)], rgb),
+             ([ImageToArray(8, 'g'), MakeComplex(phase=0.3)], rgb),
+             ([ImageToArray(16), Map(lambda x: x * 2), MakeComplex(set_as='real', imaginary=0.1)], img)]
+    for modifiers, image in cases:
+        expected = _chain(modifiers, image)
+        result = Pipeline(modifiers).process(image)
+        assert result.dtype == expected.dtype
+        np.testing.assert_allclose(result, expected, atol=1e-5)
+
+
+def test_pipeline_stack_matches_chain():
+    images = _images(4, (64, 64))
+    background = np.random.default_rng(2).uniform(0.5, 1, (64, 64)).astype('float32')
+    modifiers = [ImageToArray(16), Normalize(background), MakeComplex()]
+    expected = np.stack([_chain(modifiers, img) for img in images])
+    np.testing.assert_allclose(Pipeline(modifiers).process_stack(np.stack(images)), expected, atol=1e-5)
+
+
+def test_pipeline_result_is_not_a_buffer_view():
+    a, b = _images(2, (64, 64))
+    background = np.ones((64, 64), dtype='float32')
+    pipeline = Pipeline([ImageToArray(16), Normalize(background), Map(lambda img: img[8:40, 8:40])])
+    first = pipeline.process(a)
+    expected = first.copy()
+    pipeline.process(b)
+    np.testing.assert_array_equal(first, expected)
+
+
+def test_pipeline_shared_by_threads(tmp_path):
+    from skimage import io
+    images = _images(64, (128, 128))
+    paths = []
+    for i, img in enumerate(images):
+        paths.append(str(tmp_path / '{}.tif'.format(i)))
+        io.imsave(paths[-1], img, check_contrast=False)
+
+    background = np.random.default_rng(2).uniform(0.5, 1, (128, 128)).astype('float32')
+    modifiers = [ImageToArray(16), Normalize(background), MakeComplex()]
+    expected = [_chain(modifiers, img) for img in images]
+    results = import_image_seq(paths, [Pipeline(modifiers)], workers=4)
+    for result, target in zip(results, expected):
+        np.testing.assert_allclose(result, target, atol=1e-5)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from fringe.solvers.AngularSpectrum import AngularSpectrumSolver
+from fringe.modules.PhaseRecovery import MultiDistancePhaseOptimizer, MultiWavelengthPhaseOptimizer
+
+
+def _holograms(solver, k, z_values, shape):
+    rng = np.random.default_rng(0)
+    fy, fx = np.fft.fftfreq(shape[0])[:, None], np.fft.fftfreq(shape[1])[None, :]
+    phase = np.real(np.fft.ifft2(np.fft.fft2(rng.standard_normal(shape)) * np.exp(-(fx * fx + fy * fy) / 0.002)))
+    obj = np.exp(1j * phase / np.abs(phase).max()).astype(np.complex64)
+    return np.stack([np.abs(solver.solve(obj, k, z)) for z in z_values]).astype(np.float32)
+
+
+@pytest.mark.parametrize('backend', ['numpy', 'scipy'])
+def test_recover_stream_warm_starts(backend):
+    if backend == 'scipy':
+        pytest.importorskip('scipy')
+    k, z_values, shape = 2 * np.pi / 0.532, [100, 150, 200, 250], (64, 64)
+    solver = AngularSpectrumSolver(shape, 1.12, False, 'same', backend=backend)
+    images = _holograms(solver, k, z_values, shape)
+
+    optimizer = MultiDistancePhaseOptimizer(solver)
+    list(optimizer.recover_stream([images] * 3, k, z_values, iterations=60))
+
+    # The stored first-plane field must survive the final propagation, which the FFT of scipy could overwrite.
+    assert np.allclose(np.abs(optimizer._field), images[0], atol=1e-4)
+    assert optimizer.iterations_per_frame[1:] == [1, 1]
+
+
+@pytest.mark.parametrize('z_values', [[100, 140, 180, 220], [150, 250]])
+@pytest.mark.parametrize('algorithm', ['hio', 'raar', 'momentum'])
+def test_relaxed_algorithms_beat_gerchberg_saxton(algorithm, z_values):
+    # 'same' padding cuts the light leaving the window, so the planes are not exactly consistent.
+    k, shape, iterations = 2 * np.pi / 0.532, (64, 64), 10
+    solver = AngularSpectrumSolver(shape, 1.12, False, 'same', backend='numpy')
+    images = _holograms(solver, k, z_values, shape)
+
+    histories = {}
+    for name in ('gs', algorithm):
+        optimizer = MultiDistancePhaseOptimizer(solver, name)
+        histories[name] = optimizer.optimize(images, k, z_values, 10 * iterations, return_history=True)[1]
+    reference, history = histories['gs'], histories[algorithm]
+
+    assert history[iterations - 1] <= reference[iterations - 1]
+    # The error of every algorithm drifts a little on inconsistent data, but it must not diverge.
+    assert max(history[iterations:]) <= 1.1 * max(reference[iterations:])
+
+
+@pytest.mark.parametrize('schedule', [[(2, 5)], [(4, 5), (3, 5), (1, 5)], [(2, 5), (2, 5), (1, 5)]])
+def test_invalid_schedules_are_rejected(schedule):
+    k, shape = 2 * np.pi / 0.532, (32, 32)
+    images = np.ones((2,) + shape, dtype=np.float32)
+    solver = AngularSpectrumSolver(shape, 1.12, False, 'same', backend='numpy')
+    with pytest.raises(ValueError, match='Schedule'):
+        MultiDistancePhaseOptimizer(solver).optimize(images, k, [100, 150], schedule=schedule)
+
+    batched = AngularSpectrumSolver((2,) + shape, 1.12, True, 'same', backend='numpy')
+    with pytest.raises(ValueError, match='Schedule'):
+        MultiWavelengthPhaseOptimizer(batched).optimize(images[:, None], [k, k * 0.9], [100], schedule=schedule)
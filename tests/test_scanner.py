@@ -0,0 +1,31 @@
+import os
+import numpy as np
+from fringe.solvers.AngularSpectrum import AngularSpectrumSolver
+from fringe.solvers.Tiled import TiledSolver
+from fringe.modules.Scanner import scan_z
+from fringe.modules.Simulator import simulate_multiple
+
+
+def _field(shape):
+    field = np.zeros(shape, dtype=np.complex64)
+    field[20:25, 30:40] = 1
+    return field
+
+
+def test_scan_z_with_an_empty_range(tmp_path):
+    solver = AngularSpectrumSolver((64, 64), 2., False, 'same', backend='numpy')
+    scan_z(_field((64, 64)), 2 * np.pi / 0.532, (140, 100), 10, solver, str(tmp_path))
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_solvers_without_sweep_are_called_plane_by_plane(tmp_path):
+    k, shape = 2 * np.pi / 0.532, (64, 64)
+    field = _field(shape)
+    tiled = TiledSolver(shape, 2., tile_shape=(32, 32), workers=2)
+
+    scan_z(field, k, (-40, -20), 10, tiled, str(tmp_path))
+    assert sorted(os.listdir(str(tmp_path))) == ['0_-40.png', '1_-30.png']
+
+    holograms = simulate_multiple(field, k, 20., 10., 3, tiled, None)
+    expected = [np.abs(tiled.solve(field, k, z)) ** 2 for z in (20., 30., 40.)]
+    np.testing.assert_allclose(np.stack(holograms), np.stack(expected), rtol=1e-6)
@@ -0,0 +1,44 @@
+import tracemalloc
+import numpy as np
+import pytest
+from fringe.solvers.AngularSpectrum import AngularSpectrumSolver
+from fringe.solvers.Tiled import TiledSolver
+
+
+def _field(shape):
+    rng = np.random.default_rng(0)
+    return np.exp(1j * rng.uniform(-np.pi, np.pi, shape)).astype(np.complex64)
+
+
+@pytest.mark.parametrize('backend', ['numpy', 'scipy'])
+@pytest.mark.parametrize('max_memory, workers', [(2 ** 22, 1), (2 ** 23, 4)])
+def test_tiled_solve_respects_memory_budget(backend, max_memory, workers):
+    if backend == 'scipy':
+        pytest.importorskip('scipy')
+    k, shape = 2 * np.pi / 0.532, (512, 512)
+    x = _field(shape)
+    out = np.empty_like(x)
+    solver = TiledSolver(shape, 1.12, max_memory=max_memory, workers=workers, backend=backend)
+
+    # A cold solve and one at a new distance, so that the grids and transfer functions are created in the window.
+    tracemalloc.start()
+    try:
+        solver.solve(x, k, 100, out=out)
+        solver.solve(x, k, 150, out=out)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak <= max_memory, "Peak {:.1f} MiB for a budget of {:.1f} MiB".format(peak / 2 ** 20, max_memory / 2 ** 20)
+
+
+def test_tiled_solve_matches_full_frame():
+    k, shape, z = 2 * np.pi / 0.532, (256, 256), 40
+    fy, fx = np.fft.fftfreq(shape[0])[:, None], np.fft.fftfreq(shape[1])[None, :]
+    phase = np.real(np.fft.ifft2(np.fft.fft2(np.random.default_rng(0).standard_normal(shape)) *
+                                 np.exp(-(fx * fx + fy * fy) / 0.002)))
+    x = np.exp(1j * np.pi * phase / np.abs(phase).max()).astype(np.complex64)
+
+    tiled = TiledSolver(shape, 2., tile_shape=(64, 64), workers=2).solve(x, k, z)
+    margin = TiledSolver(shape, 2.).tiling(k, z)[0][0]
+    full = AngularSpectrumSolver(shape, 2., False, padding=[[4 * margin + 64] * 2] * 2, backend='numpy').solve(x, k, z)
+    assert np.linalg.norm(tiled - full) / np.linalg.norm(full) < 5e-3